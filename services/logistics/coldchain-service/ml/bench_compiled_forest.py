@@ -0,0 +1,62 @@
+"""
+Benchmark : latence de la forêt compilée contre predict_proba de scikit-learn.
+
+Pour chaque taille de lot, vérifie d'abord que les probabilités sont
+identiques (écart maximal), puis mesure la meilleure latence sur
+`--repeat` appels.
+
+Usage (depuis services/logistics/coldchain-service) :
+    python ml/bench_compiled_forest.py --batches 1,100,10000
+"""
+import argparse
+import time
+import warnings
+
+from bench_predict_fleet import fleet
+from compiled_forest import export_forest
+from failure_predictor import FailurePredictor
+
+TOLERANCE = 1e-9
+
+
+def latency(fn, X, repeat):
+    """Meilleur temps d'un appel sur `repeat` (s)."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(X)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batches", default="1,100,10000")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    predictor = FailurePredictor()
+    predictor.predict([4.0, 0.4, 140.0, 50.0])  # loads the saved model
+    model = predictor.model
+    start = time.perf_counter()
+    compiled = export_forest(model)
+    export_s = time.perf_counter() - start
+    print(f"export: {compiled.n_trees} trees, {compiled.n_nodes} nodes, depth {compiled.max_depth}, "
+          f"{export_s * 1000:.1f} ms")
+    warnings.filterwarnings("ignore", message="X does not have valid feature names")
+
+    print(f"{'batch':>6} | {'max |diff|':>10} | {'sklearn ms':>10} | {'compiled ms':>11} | {'speedup':>7}")
+    print("-" * 57)
+    for batch in (int(b) for b in args.batches.split(",")):
+        X = fleet(batch, seed=batch)
+        diff = abs(compiled.predict_proba(X) - model.predict_proba(X)[:, 1]).max()
+        if diff > TOLERANCE:
+            raise SystemExit(f"compiled forest differs from scikit-learn by {diff} on a batch of {batch}")
+        sklearn_s = latency(lambda X: model.predict_proba(X), X, args.repeat)
+        compiled_s = latency(compiled.predict_proba, X, args.repeat)
+        print(f"{batch:>6} | {diff:>10.1e} | {sklearn_s * 1000:>10.3f} | {compiled_s * 1000:>11.3f} | "
+              f"{sklearn_s / compiled_s:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Benchmark : FeatureEngine (mises à jour par mesure) et score périodique de
+la flotte (features() + predict_fleet()).
+
+Usage (depuis services/logistics/coldchain-service) :
+    python ml/bench_feature_engine.py --trucks 10000 --readings 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from failure_predictor import FailurePredictor
+from feature_engine import FeatureEngine, FleetScorer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--trucks", type=int, default=10_000)
+    parser.add_argument("--readings", type=int, default=1_000_000)
+    parser.add_argument("--period-s", type=float, default=10.0, help="seconds between two readings of a truck")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    temp = rng.normal(4, 2, args.readings).tolist()
+    vibration = rng.normal(0.5, 0.2, args.readings).tolist()
+    pressure = rng.normal(150, 20, args.readings).tolist()
+    truck_ids = [f"TRK-{i:05d}" for i in range(args.trucks)]
+
+    engine = FeatureEngine()
+    start_t = time.time()
+    started = time.perf_counter()
+    for i in range(args.readings):
+        truck = i % args.trucks
+        timestamp = start_t + (i // args.trucks) * args.period_s
+        engine.update(truck_ids[truck], timestamp, temp[i], vibration[i], pressure[i])
+    update_s = time.perf_counter() - started
+
+    scorer = FleetScorer(engine, FailurePredictor())
+    scorer.score_once()  # loads the model
+    started = time.perf_counter()
+    ids, X = engine.features()
+    features_s = time.perf_counter() - started
+    started = time.perf_counter()
+    scorer.score_once()
+    score_s = time.perf_counter() - started
+
+    print(f"{args.readings} readings over {args.trucks} trucks (window {engine.window} samples)")
+    print(f"update:     {update_s / args.readings * 1e6:.2f} us/reading ({args.readings / update_s:.0f} readings/s)")
+    print(f"features(): {features_s * 1000:.1f} ms for {len(ids)} trucks")
+    print(f"score_once: {score_s * 1000:.1f} ms (features + predict_fleet), {scorer.stats()['critical']} critical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark : score de toute la flotte, predict() camion par camion contre
+un seul appel predict_fleet().
+
+Usage (depuis services/logistics/coldchain-service) :
+    python ml/bench_predict_fleet.py --trucks 10000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from failure_predictor import FailurePredictor
+
+
+def fleet(trucks, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.normal(4, 2, trucks),        # avg_temp
+        rng.normal(0.5, 0.2, trucks),    # vibration
+        rng.normal(150, 20, trucks),     # gas_pressure
+        rng.uniform(10, 100, trucks),    # weekly_runtime
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--trucks", type=int, default=10_000)
+    parser.add_argument("--per-truck-sample", type=int, default=200,
+                        help="trucks actually scored one by one (the rest is extrapolated)")
+    args = parser.parse_args()
+
+    X = fleet(args.trucks)
+    predictor = FailurePredictor()
+    start = time.perf_counter()
+    predictor.predict(X[0].tolist())  # loads the saved model
+    load_s = time.perf_counter() - start
+
+    sample = min(args.per_truck_sample, args.trucks)
+    start = time.perf_counter()
+    for row in X[:sample]:
+        predictor.predict(row.tolist())
+    per_truck_s = (time.perf_counter() - start) / sample
+
+    start = time.perf_counter()
+    result = predictor.predict_fleet(X)
+    fleet_s = time.perf_counter() - start
+
+    print(f"model load: {load_s * 1000:.0f} ms (once per process)")
+    print(f"predict() x {args.trucks}: {per_truck_s * args.trucks:.2f} s "
+          f"({per_truck_s * 1000:.2f} ms/truck, extrapolated from {sample})")
+    print(f"predict_fleet({args.trucks}): {fleet_s * 1000:.1f} ms "
+          f"({fleet_s / args.trucks * 1e6:.1f} us/truck, x{per_truck_s * args.trucks / fleet_s:.0f})")
+    print(f"warning: {int((result['status'] == 'Warning').sum())}, critical: {int(result['critical'].sum())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,11 +5,57 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report
 import joblib
 import os
+import warnings
+
+try:
+    from compiled_forest import CompiledForest, export_forest
+except ImportError:  # imported as ml.failure_predictor
+    from .compiled_forest import CompiledForest, export_forest
+
+MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "failure_model.pkl")
+# Flattened copy of the forest written by train(), see compiled_forest.py
+COMPILED_MODEL_PATH = os.path.splitext(MODEL_PATH)[0] + ".npz"
+FEATURES = ['avg_temp', 'vibration', 'gas_pressure', 'weekly_runtime']
+WARNING_THRESHOLD = 0.5
+CRITICAL_THRESHOLD = 0.8
+# Larger batches go to scikit-learn, whose Cython traversal is faster there
+COMPILED_MAX_BATCH = int(os.getenv("COMPILED_MAX_BATCH", 500))
+
+# Modèles chargés, par chemin : un seul joblib.load par processus
+_LOADED_MODELS = {}
+
+
+def load_model(path=MODEL_PATH):
+    """Charge le modèle sauvegardé (une fois par processus et par version du fichier)."""
+    mtime = os.path.getmtime(path)
+    cached = _LOADED_MODELS.get(path)
+    if cached is None or cached[0] != mtime:
+        cached = _LOADED_MODELS[path] = (mtime, joblib.load(path))
+    return cached[1]
+
+
+def feature_matrix(data):
+    """
+    Matrice (n, 4) float64 à partir d'un tableau NumPy (colonnes dans l'ordre
+    de FEATURES), d'un DataFrame ou d'un dict de colonnes {feature: valeurs}.
+    """
+    if isinstance(data, (pd.DataFrame, dict)):
+        data = np.column_stack([np.asarray(data[name], dtype=np.float64) for name in FEATURES])
+    X = np.ascontiguousarray(data, dtype=np.float64)
+    if X.ndim != 2 or X.shape[1] != len(FEATURES):
+        raise ValueError(f"Expected a (n, {len(FEATURES)}) feature matrix {FEATURES}, got shape {X.shape}")
+    return X
+
 
 class FailurePredictor:
     def __init__(self):
         self.model = RandomForestClassifier(n_estimators=100, random_state=42)
-        self.model_path = "services/logistics/coldchain-service/ml/failure_model.pkl"
+        self.model_path = MODEL_PATH
+        self.compiled_path = COMPILED_MODEL_PATH
+        self.compiled = None
+        self._fitted = False
+        # mtime of the model file in use: a newer file (promotion) is reloaded
+        self._model_mtime = None
 
     def generate_synthetic_data(self, samples=1000):
         """
@@ -37,6 +83,7 @@ class FailurePredictor:
         })
 
     def train(self):
+        # Bootstrap model on synthetic data; real exports go through train_pipeline.py
         print("📊 Préparation des données d'entraînement...")
         df = self.generate_synthetic_data()
         X = df.drop('target', axis=1)
@@ -54,18 +101,82 @@ class FailurePredictor:
         # Sauvegarde
         os.makedirs(os.path.dirname(self.model_path), exist_ok=True)
         joblib.dump(self.model, self.model_path)
-        print(f"✅ Modèle sauvegardé dans {self.model_path}")
+        self.compiled = export_forest(self.model)
+        self.compiled.save(self.compiled_path)
+        self._fitted = True
+        self._model_mtime = os.path.getmtime(self.model_path)
+        print(f"✅ Modèle sauvegardé dans {self.model_path} (forêt compilée : {self.compiled_path})")
+
+    def _load_compiled(self):
+        """Forêt compilée par train(), ou exportée du modèle si absente ou plus ancienne."""
+        try:
+            if os.path.getmtime(self.compiled_path) >= os.path.getmtime(self.model_path):
+                return CompiledForest.load(self.compiled_path)
+        except (OSError, ValueError):
+            pass
+        return export_forest(self.model)
+
+    def _ensure_model(self):
+        """
+        Modèle sauvegardé, entraîné s'il n'existe pas. Rechargé (avec sa forêt
+        compilée) dès que le fichier change, ex. après `train_pipeline.py
+        --promote` : un os.stat par appel.
+        """
+        try:
+            mtime = os.path.getmtime(self.model_path)
+        except OSError:
+            mtime = None
+        if mtime is None:
+            if not self._fitted:
+                self.train()
+            return
+        if mtime == self._model_mtime:
+            return
+        model = load_model(self.model_path)
+        names = list(getattr(model, "feature_names_in_", FEATURES))
+        self._model_mtime = mtime
+        if names != FEATURES:
+            message = f"{self.model_path} expects features {names}, not {FEATURES}"
+            if not self._fitted:
+                raise ValueError(message)
+            # Keep scoring with the current model rather than failing every call
+            warnings.warn(f"{message}: keeping the previous model")
+            return
+        self.model = model
+        self.compiled = self._load_compiled()
+        self._fitted = True
+
+    def predict_fleet(self, features):
+        """
+        Score toute une flotte en un seul appel : forêt compilée jusqu'à
+        COMPILED_MAX_BATCH camions, predict_proba de scikit-learn au-delà.
+
+        `features` : tableau (n, 4) dans l'ordre de FEATURES, DataFrame ou dict
+        de colonnes. Retourne des tableaux de longueur n : probabilité de
+        panne (%), statut ("Warning" / "Safe") et indicateur critique.
+        """
+        self._ensure_model()
+        X = feature_matrix(features)
+        if len(X) <= COMPILED_MAX_BATCH:
+            probability = self.compiled.predict_proba(X)
+        else:
+            with warnings.catch_warnings():
+                # The model was fitted on a DataFrame; columns follow FEATURES
+                warnings.filterwarnings("ignore", message="X does not have valid feature names")
+                probability = self.model.predict_proba(X)[:, 1]
+        return {
+            "failure_probability": np.round(probability * 100, 2),
+            "status": np.where(probability > WARNING_THRESHOLD, "Warning", "Safe"),
+            "critical": probability > CRITICAL_THRESHOLD,
+        }
 
     def predict(self, current_data):
-        if not os.path.exists(self.model_path):
-            self.train()
-        
         # Prédiction pour un vecteur de données [temp, vib, press, runtime]
-        prediction = self.model.predict_proba([current_data])[0]
+        result = self.predict_fleet([current_data])
         return {
-            "failure_probability": round(prediction[1] * 100, 2),
-            "status": "Warning" if prediction[1] > 0.5 else "Safe",
-            "critical": prediction[1] > 0.8
+            "failure_probability": float(result["failure_probability"][0]),
+            "status": str(result["status"][0]),
+            "critical": bool(result["critical"][0])
         }
 
 if __name__ == "__main__":
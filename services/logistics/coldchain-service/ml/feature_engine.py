@@ -0,0 +1,200 @@
+"""
+Features de FailurePredictor calculées en continu à partir de la télémétrie.
+
+Pour chaque camion, les dernières `window` mesures de température, de
+vibration et de pression de gaz sont gardées dans des buffers circulaires
+(tableaux NumPy de forme (camions, 3, window), aucun objet Python par
+mesure) avec leurs sommes courantes : moyenne mise à jour en O(1). Les
+sommes sont recalculées à chaque tour de buffer pour ne pas dériver.
+
+Le temps de fonctionnement du compresseur est cumulé par heure dans un
+anneau de 168 cases (une semaine) : `weekly_runtime` est la somme de
+l'anneau, en heures. Sans indicateur explicite, le compresseur est
+considéré en marche quand la vibration dépasse COMPRESSOR_RUNNING_VIBRATION.
+
+features() retourne la matrice (n, 4) dans l'ordre de FEATURES de
+failure_predictor ; FleetScorer la passe à predict_fleet() toutes les
+`interval_s` secondes dans un thread.
+"""
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+FEATURE_WINDOW_SAMPLES = int(os.getenv("FEATURE_WINDOW_SAMPLES", 180))
+FAILURE_SCORING_INTERVAL_S = float(os.getenv("FAILURE_SCORING_INTERVAL_S", 60))
+COMPRESSOR_RUNNING_VIBRATION = float(os.getenv("COMPRESSOR_RUNNING_VIBRATION", 0.1))
+RUNTIME_SLOTS = 168  # hours in a week
+# A longer silence between two readings is not counted as runtime
+MAX_RUNTIME_GAP_S = 300
+
+SIGNALS = ("avg_temp", "vibration", "gas_pressure")
+
+
+class FeatureEngine:
+    def __init__(self, window=FEATURE_WINDOW_SAMPLES, capacity=1024):
+        self.window = window
+        self._lock = threading.Lock()
+        self._index = {}
+        self._ids = []
+        self._capacity = 0
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        """Agrandit les tableaux (doublement) en gardant les camions connus."""
+        old = self._capacity
+
+        def grown(array, fill=0):
+            out = np.full((capacity,) + array.shape[1:], fill, dtype=array.dtype)
+            out[:old] = array[:old]
+            return out
+
+        if old == 0:
+            signals = len(SIGNALS)
+            self._ring = np.zeros((capacity, signals, self.window), dtype=np.float32)
+            self._head = np.zeros((capacity, signals), dtype=np.int32)
+            self._count = np.zeros((capacity, signals), dtype=np.int32)
+            self._sums = np.zeros((capacity, signals), dtype=np.float64)
+            self._runtime = np.zeros((capacity, RUNTIME_SLOTS), dtype=np.float32)
+            self._runtime_total = np.zeros(capacity, dtype=np.float64)
+            self._hour = np.full(capacity, -1, dtype=np.int64)
+            self._last_t = np.full(capacity, np.nan, dtype=np.float64)
+            self._running = np.zeros(capacity, dtype=bool)
+        else:
+            self._ring = grown(self._ring)
+            self._head = grown(self._head)
+            self._count = grown(self._count)
+            self._sums = grown(self._sums)
+            self._runtime = grown(self._runtime)
+            self._runtime_total = grown(self._runtime_total)
+            self._hour = grown(self._hour, -1)
+            self._last_t = grown(self._last_t, np.nan)
+            self._running = grown(self._running)
+        self._capacity = capacity
+
+    def _row(self, truck_id):
+        row = self._index.get(truck_id)
+        if row is None:
+            row = self._index[truck_id] = len(self._ids)
+            self._ids.append(truck_id)
+            if row >= self._capacity:
+                self._grow(self._capacity * 2)
+        return row
+
+    def update(self, truck_id, timestamp_s, temp=None, vibration=None, gas_pressure=None, running=None):
+        """Prend en compte une mesure (valeurs absentes : None) en O(1)."""
+        with self._lock:
+            row = self._row(truck_id)
+            # Row views and Python scalars: NumPy scalar arithmetic is slow
+            ring, heads, counts, sums = self._ring[row], self._head[row], self._count[row], self._sums[row]
+            for k, value in enumerate((temp, vibration, gas_pressure)):
+                if value is None or not math.isfinite(value):
+                    continue
+                head = int(heads[k])
+                full = counts[k] == self.window
+                old = float(ring[k, head]) if full else 0.0
+                ring[k, head] = value
+                head += 1
+                if head == self.window:
+                    head = 0
+                    sums[k] = ring[k].sum(dtype=np.float64)
+                else:
+                    sums[k] += value - old
+                heads[k] = head
+                if not full:
+                    counts[k] += 1
+
+            if running is None and vibration is not None and math.isfinite(vibration):
+                running = vibration >= COMPRESSOR_RUNNING_VIBRATION
+            self._add_runtime(row, timestamp_s)
+            if running is not None:
+                self._running[row] = running
+
+    def _add_runtime(self, row, timestamp_s):
+        hour = int(timestamp_s // 3600)
+        current = self._hour[row]
+        if hour > current:
+            if current >= 0:
+                # Clear the hours skipped since the last reading (at most a week)
+                for h in range(current + 1, min(hour, current + RUNTIME_SLOTS) + 1):
+                    self._runtime[row, h % RUNTIME_SLOTS] = 0.0
+            self._hour[row] = hour
+            self._runtime_total[row] = self._runtime[row].sum(dtype=np.float64)
+        last = self._last_t[row]
+        if self._running[row] and last == last:  # not NaN: there is a previous reading
+            elapsed = min(timestamp_s - last, MAX_RUNTIME_GAP_S)
+            if elapsed > 0:
+                self._runtime[row, hour % RUNTIME_SLOTS] += elapsed
+                self._runtime_total[row] += elapsed
+        if not last == last or timestamp_s > last:
+            self._last_t[row] = timestamp_s
+
+    def __len__(self):
+        return len(self._ids)
+
+    def features(self, min_samples=1):
+        """
+        (truck_ids, matrice (n, 4)) des camions ayant au moins `min_samples`
+        mesures de chaque signal, colonnes dans l'ordre de FEATURES.
+        """
+        with self._lock:
+            n = len(self._ids)
+            counts = self._count[:n]
+            ready = np.flatnonzero((counts >= min_samples).all(axis=1))
+            means = self._sums[ready] / counts[ready]
+            runtime_h = self._runtime_total[ready] / 3600
+            ids = [self._ids[i] for i in ready]
+        return ids, np.column_stack([means, runtime_h])
+
+
+class FleetScorer:
+    """Passe la matrice de features au prédicteur toutes les `interval_s` secondes."""
+
+    def __init__(self, engine, predictor, interval_s=FAILURE_SCORING_INTERVAL_S, on_scores=None):
+        self.engine = engine
+        self.predictor = predictor
+        self.interval_s = interval_s
+        self.on_scores = on_scores
+        self.latest = None  # (truck_ids, predict_fleet() result, unix time)
+        self.last_score_ms = 0.0
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def score_once(self):
+        truck_ids, X = self.engine.features()
+        if not truck_ids:
+            return None
+        started = time.perf_counter()
+        result = self.predictor.predict_fleet(X)
+        self.last_score_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.latest = (truck_ids, result, time.time())
+        if self.on_scores is not None:
+            self.on_scores(truck_ids, result)
+        return result
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.score_once()
+            except Exception as e:
+                self.last_error = repr(e)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="fleet-scorer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self):
+        scored = len(self.latest[0]) if self.latest else 0
+        critical = int(self.latest[1]["critical"].sum()) if self.latest else 0
+        return {"trucks": len(self.engine), "scored": scored, "critical": critical,
+                "last_score_ms": self.last_score_ms, "last_error": self.last_error}
@@ -0,0 +1,324 @@
+"""
+Entraînement de FailurePredictor sur des exports de télémétrie étiquetés.
+
+- Lecture en flux : fichiers CSV (pandas, par blocs de TRAINING_CHUNK_ROWS
+  lignes) ou Parquet (pyarrow, par lots), seules les colonnes FEATURES et
+  la cible sont lues ; les lignes incomplètes sont écartées. En mémoire ne
+  restent que les tableaux float32 du jeu de données, plus un bloc.
+- Recherche d'hyperparamètres en validation croisée (StratifiedKFold) sur
+  80 % des lignes : chaque (paramètres, pli) est un ajustement
+  indépendant, exécuté sur TRAINING_WORKERS processus.
+- Reprise : chaque ajustement terminé est ajouté au fichier de
+  checkpoint du run (une ligne JSON). Le run est identifié par les
+  données, la grille et le découpage : relancer la même commande après une
+  interruption ne refait que les ajustements manquants.
+- Le meilleur jeu de paramètres est réentraîné sur les 80 %, évalué sur
+  les 20 % restants, puis sauvegardé dans un dossier versionné
+  (models/<version>/ : model.pkl, model.npz compilé, metadata.json avec
+  paramètres, métriques et temps d'entraînement). `--promote` le copie à
+  la place du modèle chargé par FailurePredictor.
+
+Usage (depuis services/logistics/coldchain-service) :
+    python ml/train_pipeline.py exports/telemetry-2026-*.parquet --target failure --promote
+    python ml/train_pipeline.py --synthetic 50000
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import shutil
+import signal
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score, precision_score, recall_score, roc_auc_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+from compiled_forest import export_forest
+from failure_predictor import COMPILED_MODEL_PATH, FEATURES, MODEL_PATH, WARNING_THRESHOLD, FailurePredictor
+
+ML_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.getenv("FAILURE_MODELS_DIR", os.path.join(ML_DIR, "models"))
+CHECKPOINT_DIR = os.getenv("FAILURE_TRAINING_CHECKPOINT_DIR", os.path.join(ML_DIR, "checkpoints"))
+TRAINING_CHUNK_ROWS = int(os.getenv("TRAINING_CHUNK_ROWS", 100_000))
+TRAINING_WORKERS = int(os.getenv("TRAINING_WORKERS", os.cpu_count() or 1))
+
+TARGET = "target"
+CV_FOLDS = 5
+TEST_SIZE = 0.2
+SEED = 42
+# Cross-validation metric used to pick the parameters
+SCORING = "roc_auc"
+PARAM_GRID = {
+    "n_estimators": [100, 200],
+    "max_depth": [None, 8, 16],
+    "min_samples_leaf": [1, 5],
+    "max_features": ["sqrt", None],
+}
+
+
+def read_chunks(path, columns, chunk_rows=TRAINING_CHUNK_ROWS):
+    """DataFrames successifs de `columns` lus dans un export CSV ou Parquet."""
+    if path.endswith((".parquet", ".pq")):
+        if pq is None:
+            raise RuntimeError(f"Reading {path} needs pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    elif path.endswith((".csv", ".csv.gz")):
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+    else:
+        raise ValueError(f"{path}: expected a .csv, .csv.gz or .parquet export")
+
+
+def load_dataset(paths, target=TARGET, chunk_rows=TRAINING_CHUNK_ROWS):
+    """(X float32 (n, 4), y int8 (n,), lignes lues, lignes écartées) de tous les exports."""
+    columns = FEATURES + [target]
+    parts_X, parts_y = [], []
+    read = dropped = 0
+    for path in paths:
+        for chunk in read_chunks(path, columns, chunk_rows):
+            values = chunk[columns].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=np.float64)
+            valid = np.isfinite(values).all(axis=1) & np.isin(values[:, -1], (0, 1))
+            read += len(values)
+            dropped += int((~valid).sum())
+            parts_X.append(values[valid, :-1].astype(np.float32))
+            parts_y.append(values[valid, -1].astype(np.int8))
+    if not parts_X:
+        raise ValueError("No training rows read")
+    return np.concatenate(parts_X), np.concatenate(parts_y), read, dropped
+
+
+def candidates(grid):
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _key(params):
+    return json.dumps(params, sort_keys=True)
+
+
+def run_id(X, y, grid, folds):
+    """Identifiant stable d'un run : mêmes données et même recherche, même checkpoint."""
+    digest = hashlib.sha1()
+    digest.update(X.tobytes())
+    digest.update(y.tobytes())
+    digest.update(json.dumps({"grid": grid, "folds": folds, "test_size": TEST_SIZE, "seed": SEED,
+                              "scoring": SCORING}, sort_keys=True).encode())
+    return digest.hexdigest()[:12]
+
+
+def load_checkpoint(path):
+    """{(paramètres, pli): résultat} des ajustements déjà terminés."""
+    done = {}
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # last line cut short by a kill
+                done[(_key(record["params"]), record["fold"])] = record
+    except FileNotFoundError:
+        pass
+    return done
+
+
+# Set in each search process by _init_worker
+_X = _y = _splits = None
+
+
+def _init_worker(X, y, splits):
+    global _X, _y, _splits
+    # Ctrl-C is handled by the parent, which stops the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _X, _y, _splits = X, y, splits
+
+
+def _fit_fold(params, fold):
+    train, test = _splits[fold]
+    start = time.perf_counter()
+    model = RandomForestClassifier(**params, random_state=SEED, n_jobs=1).fit(_X[train], _y[train])
+    score = roc_auc_score(_y[test], model.predict_proba(_X[test])[:, 1])
+    return {"params": params, "fold": fold, "score": float(score),
+            "fit_s": round(time.perf_counter() - start, 3)}
+
+
+def search(X, y, grid, folds, workers, checkpoint_path):
+    """Validation croisée de toute la grille ; retourne {clé des paramètres: [résultats par pli]}."""
+    splits = list(StratifiedKFold(folds, shuffle=True, random_state=SEED).split(X, y))
+    done = load_checkpoint(checkpoint_path)
+    todo = [(params, fold) for params in candidates(grid) for fold in range(folds)
+            if (_key(params), fold) not in done]
+    total = len(done) + len(todo)
+    print(f"🔎 {len(candidates(grid))} candidats x {folds} plis : {len(done)} ajustements repris du "
+          f"checkpoint, {len(todo)} à faire sur {workers} processus")
+
+    if todo:
+        os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+        pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(X, y, splits))
+        try:
+            with open(checkpoint_path, "a") as checkpoint:
+                futures = [pool.submit(_fit_fold, params, fold) for params, fold in todo]
+                for future in as_completed(futures):
+                    record = future.result()
+                    checkpoint.write(json.dumps(record) + "\n")
+                    checkpoint.flush()
+                    os.fsync(checkpoint.fileno())
+                    done[(_key(record["params"]), record["fold"])] = record
+                    print(f"  {len(done)}/{total} {record['params']} pli {record['fold']} : "
+                          f"{SCORING}={record['score']:.4f} ({record['fit_s']:.1f} s)")
+        except KeyboardInterrupt:
+            pool.shutdown(wait=False, cancel_futures=True)
+            for process in multiprocessing.active_children():
+                process.terminate()
+            raise SystemExit(f"⏸️ Interrompu : {len(done)}/{total} ajustements dans {checkpoint_path}, "
+                             f"relancer la même commande pour reprendre")
+        pool.shutdown()
+
+    results = {}
+    for (key, _fold), record in sorted(done.items()):
+        results.setdefault(key, []).append(record)
+    return results
+
+
+def test_metrics(y, probability):
+    predicted = probability > WARNING_THRESHOLD
+    return {
+        "roc_auc": float(roc_auc_score(y, probability)) if len(np.unique(y)) == 2 else None,
+        "f1": float(f1_score(y, predicted, zero_division=0)),
+        "precision": float(precision_score(y, predicted, zero_division=0)),
+        "recall": float(recall_score(y, predicted, zero_division=0)),
+        "accuracy": float(accuracy_score(y, predicted)),
+    }
+
+
+def model_version(started):
+    """
+    Version d'un modèle : début du run (UTC, à la milliseconde) plus un
+    suffixe aléatoire, pour que deux runs lancés dans la même seconde
+    n'écrivent pas dans le même dossier. L'ordre alphabétique reste
+    l'ordre chronologique.
+    """
+    stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime(started))
+    return f"{stamp}.{int(started * 1000) % 1000:03d}Z-{uuid.uuid4().hex[:6]}"
+
+
+def save_artifact(model, compiled, metadata, models_dir=MODELS_DIR):
+    """Écrit models/<version>/ (dossier temporaire puis renommage) et retourne son chemin."""
+    os.makedirs(models_dir, exist_ok=True)
+    path = os.path.join(models_dir, metadata["version"])
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    joblib.dump(model, os.path.join(tmp, "model.pkl"))
+    compiled.save(os.path.join(tmp, "model.npz"))
+    with open(os.path.join(tmp, "metadata.json"), "w") as f:
+        json.dump(metadata, f, indent=2)
+    os.replace(tmp, path)
+    return path
+
+
+def promote(artifact_path):
+    """Remplace le modèle chargé par FailurePredictor (pickle d'abord : le .npz doit être plus récent)."""
+    for name, destination in (("model.pkl", MODEL_PATH), ("model.npz", COMPILED_MODEL_PATH)):
+        tmp = destination + ".tmp"
+        shutil.copyfile(os.path.join(artifact_path, name), tmp)
+        os.replace(tmp, destination)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("exports", nargs="*", help="labelled telemetry exports (.csv, .csv.gz, .parquet)")
+    parser.add_argument("--target", default=TARGET, help="label column (1 = compressor failure)")
+    parser.add_argument("--synthetic", type=int, metavar="ROWS",
+                        help="train on FailurePredictor's synthetic data instead of exports")
+    parser.add_argument("--grid", type=json.loads, default=PARAM_GRID, help="parameter grid as JSON")
+    parser.add_argument("--folds", type=int, default=CV_FOLDS)
+    parser.add_argument("--workers", type=int, default=TRAINING_WORKERS)
+    parser.add_argument("--chunk-rows", type=int, default=TRAINING_CHUNK_ROWS)
+    parser.add_argument("--promote", action="store_true", help="make this model the one FailurePredictor loads")
+    args = parser.parse_args()
+    if bool(args.exports) == bool(args.synthetic):
+        parser.error("give either exports or --synthetic ROWS")
+
+    started = time.time()
+    start = time.perf_counter()
+    if args.synthetic:
+        df = FailurePredictor().generate_synthetic_data(args.synthetic)
+        X, y = df[FEATURES].to_numpy(np.float32), df["target"].to_numpy(np.int8)
+        read, dropped, sources = len(df), 0, [f"synthetic:{args.synthetic}"]
+    else:
+        X, y, read, dropped = load_dataset(args.exports, args.target, args.chunk_rows)
+        sources = [os.path.abspath(path) for path in args.exports]
+    load_s = time.perf_counter() - start
+    print(f"📊 {len(X)} lignes ({dropped} écartées sur {read}), {y.mean():.2%} de pannes, {load_s:.1f} s")
+    if np.bincount(y, minlength=2).min() < args.folds:
+        raise SystemExit(f"Need at least {args.folds} rows of each class for {args.folds}-fold cross-validation")
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, stratify=y,
+                                                        random_state=SEED)
+    run = run_id(X, y, args.grid, args.folds)
+    checkpoint_path = os.path.join(CHECKPOINT_DIR, f"{run}.jsonl")
+    start = time.perf_counter()
+    results = search(X_train, y_train, args.grid, args.folds, args.workers, checkpoint_path)
+    search_s = time.perf_counter() - start
+    scores = {key: np.array([r["score"] for r in records]) for key, records in results.items()}
+    best_key = max(scores, key=lambda key: scores[key].mean())
+    best = json.loads(best_key)
+    print(f"🏆 Meilleurs paramètres : {best} ({SCORING}={scores[best_key].mean():.4f} "
+          f"± {scores[best_key].std():.4f})")
+
+    print("🧠 Entraînement du modèle final...")
+    start = time.perf_counter()
+    model = RandomForestClassifier(**best, random_state=SEED, n_jobs=args.workers)
+    model.fit(pd.DataFrame(X_train, columns=FEATURES), y_train)
+    model.n_jobs = None  # scoring in the bridge stays single-threaded
+    refit_s = time.perf_counter() - start
+    compiled = export_forest(model)
+    probability = compiled.predict_proba(X_test)
+    metrics = test_metrics(y_test, probability)
+
+    metadata = {
+        "version": model_version(started),
+        "run_id": run,
+        "sources": sources,
+        "features": FEATURES,
+        "target": args.target,
+        "rows": {"read": read, "dropped": dropped, "train": len(X_train), "test": len(X_test)},
+        "failure_rate": float(y.mean()),
+        "params": best,
+        "search": {
+            "scoring": SCORING, "folds": args.folds, "candidates": len(scores), "workers": args.workers,
+            "cv_mean": float(scores[best_key].mean()), "cv_std": float(scores[best_key].std()),
+            "fit_s_total": round(sum(r["fit_s"] for records in results.values() for r in records), 1),
+        },
+        "test_metrics": metrics,
+        "compiled": {"trees": compiled.n_trees, "nodes": compiled.n_nodes, "max_depth": compiled.max_depth},
+        "training_time_s": {"load": round(load_s, 1), "search": round(search_s, 1), "refit": round(refit_s, 1),
+                            "total": round(time.time() - started, 1)},
+        "sklearn_version": sklearn.__version__,
+    }
+    path = save_artifact(model, compiled, metadata)
+    print(f"📈 Test : {json.dumps(metrics)}")
+    print(f"✅ Modèle {metadata['version']} sauvegardé dans {path}")
+    if args.promote:
+        promote(path)
+        print(f"🚀 Promu : {MODEL_PATH}")
+
+
+if __name__ == "__main__":
+    main()
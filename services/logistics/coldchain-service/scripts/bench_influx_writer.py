@@ -0,0 +1,127 @@
+"""
+Benchmark : débit du pont MQTT -> InfluxDB, écriture point par point
+(ancien code, SYNCHRONOUS) contre BatchWriter.
+
+Un serveur HTTP local joue le rôle d'InfluxDB (/api/v2/write) avec une
+latence réseau simulée. On mesure le temps passé dans le callback MQTT
+(ce qui bloque la boucle paho) et le temps jusqu'à ce que toutes les
+lignes soient reçues par le serveur.
+
+Usage (depuis services/logistics/coldchain-service) :
+    python scripts/bench_influx_writer.py --messages 100000 --legacy-messages 2000 --latency-ms 2
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+from influxdb_client import InfluxDBClient, Point, WritePrecision
+from influxdb_client.client.write_api import SYNCHRONOUS
+
+from influx_writer import BatchWriter, influx_sink
+from mqtt_to_influx import BridgeState, on_message
+
+
+class StandInInflux(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency_s):
+        super().__init__(("127.0.0.1", 0), _WriteHandler)
+        self.latency_s = latency_s
+        self.lines = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class _WriteHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.server.latency_s)
+        with self.server._lock:
+            self.server.lines += body.count(b"\n") + 1 if body else 0
+            self.server.requests += 1
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def messages(count, trucks=200):
+    for i in range(count):
+        payload = json.dumps({"temp": 2 + (i % 50) / 10, "humidity": 80 + (i % 7)}).encode()
+        yield SimpleNamespace(topic=f"truck/TRK-{i % trucks:04d}/telemetry", payload=payload)
+
+
+def wait_for(server, expected, timeout=120):
+    deadline = time.perf_counter() + timeout
+    while server.lines < expected and time.perf_counter() < deadline:
+        time.sleep(0.005)
+
+
+def run_legacy(server, count):
+    """Ancien on_message : un Point et une requête HTTP synchrone par message."""
+    client = InfluxDBClient(url=server.url, token="bench", org="agrilogistic")
+    write_api = client.write_api(write_options=SYNCHRONOUS)
+    start = time.perf_counter()
+    for msg in messages(count):
+        payload = json.loads(msg.payload.decode())
+        point = Point("telemetry") \
+            .tag("truck_id", msg.topic.split('/')[1]) \
+            .field("temperature", float(payload['temp'])) \
+            .field("humidity", float(payload['humidity'])) \
+            .time(time.time_ns(), WritePrecision.NS)
+        write_api.write(bucket="cold_chain", record=point)
+    elapsed = time.perf_counter() - start
+    client.close()
+    return elapsed, elapsed
+
+
+def run_batched(server, count, batch_size, flush_interval_s):
+    writer = BatchWriter(influx_sink(server.url, "bench", "agrilogistic", "cold_chain"),
+                         batch_size=batch_size, flush_interval_s=flush_interval_s).start()
+    state = BridgeState(writer)
+    start = time.perf_counter()
+    for msg in messages(count):
+        on_message(None, state, msg)
+    callback_s = time.perf_counter() - start
+    wait_for(server, count)
+    delivered_s = time.perf_counter() - start
+    writer.close()
+    return callback_s, delivered_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--legacy-messages", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--flush-interval-s", type=float, default=1.0)
+    args = parser.parse_args()
+
+    print(f"{'mode':>8} | {'messages':>8} | {'callback msg/s':>14} | {'end-to-end msg/s':>16} | {'HTTP requests':>13}")
+    print("-" * 72)
+    for mode, count in (("legacy", args.legacy_messages), ("batched", args.messages)):
+        server = StandInInflux(args.latency_ms / 1000)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        if mode == "legacy":
+            callback_s, delivered_s = run_legacy(server, count)
+        else:
+            callback_s, delivered_s = run_batched(server, count, args.batch_size, args.flush_interval_s)
+        server.shutdown()
+        print(f"{mode:>8} | {count:>8} | {count / callback_s:>14.0f} | {count / delivered_s:>16.0f}"
+              f" | {server.requests:>13}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Microbenchmark : décodage des charges utiles de télémétrie (messages/s).
+
+Compare l'ancien décodage (json.loads(payload.decode()) + float), JSON,
+binaire compact (une mesure, puis des lots de mesures par message) et
+MessagePack s'il est installé. Mesure ensuite on_message complet (lignes,
+agrégats, détection d'excursions) avec un writer qui ne fait rien.
+
+Usage (depuis services/logistics/coldchain-service) :
+    python scripts/bench_payload_decode.py --messages 200000
+"""
+import argparse
+import json
+import time
+from types import SimpleNamespace
+
+from excursions import ExcursionDetector
+from mqtt_to_influx import MEASUREMENT, BridgeState, on_message
+from payloads import decode, encode_binary, msgpack
+from rollups import Rollups
+
+
+class NullWriter:
+    def add(self, line, urgent=False):
+        pass
+
+
+def readings(count):
+    return [(2 + (i % 50) / 10, 80 + (i % 7) / 2, 0) for i in range(count)]
+
+
+def legacy_decode(payload):
+    data = json.loads(payload.decode())
+    return [(float(data['temp']), float(data['humidity']), 0)]
+
+
+def payloads(kind, count, batch):
+    values = readings(count)
+    if kind == "json":
+        return [json.dumps({"temp": t, "humidity": h}).encode() for t, h, _ in values]
+    if kind == "msgpack":
+        return [msgpack.packb({"temp": t, "humidity": h}) for t, h, _ in values]
+    return [encode_binary(values[i:i + batch]) for i in range(0, count, batch)]
+
+
+def rate(fn, items, repeat=3):
+    """Meilleur débit sur `repeat` passes (items/s)."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return len(items) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=10, help="readings per batched binary message")
+    parser.add_argument("--trucks", type=int, default=2000)
+    args = parser.parse_args()
+
+    cases = [("legacy json", "json", 1, legacy_decode), ("json", "json", 1, decode),
+             ("binary", "binary", 1, decode), (f"binary x{args.batch}", "binary", args.batch, decode)]
+    if msgpack is not None:
+        cases.append(("msgpack", "msgpack", 1, decode))
+
+    print(f"{'decode':>12} | {'bytes/reading':>13} | {'messages/s':>10} | {'readings/s':>10}")
+    print("-" * 56)
+    for label, kind, batch, fn in cases:
+        items = payloads(kind, args.messages, batch)
+        size = sum(len(p) for p in items) / args.messages
+        per_s = rate(fn, items)
+        print(f"{label:>12} | {size:>13.1f} | {per_s:>10.0f} | {per_s * batch:>10.0f}")
+
+    print()
+    print(f"{'on_message':>12} | {'messages/s':>10} | {'readings/s':>10}")
+    print("-" * 40)
+    for label, kind, batch in (("json", "json", 1), ("binary", "binary", 1),
+                               (f"binary x{args.batch}", "binary", args.batch)):
+        state = BridgeState(NullWriter(), ExcursionDetector(), Rollups(MEASUREMENT))
+        items = [SimpleNamespace(topic=f"truck/TRK-{i % args.trucks:05d}/telemetry", payload=p)
+                 for i, p in enumerate(payloads(kind, args.messages, batch))]
+        per_s = rate(lambda msg: on_message(None, state, msg), items, repeat=1)
+        print(f"{label:>12} | {per_s:>10.0f} | {per_s * batch:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Détection en continu des excursions de température, camion par camion.
+
+Chaque camion a un petit automate (hors plage / dans la plage) mis à jour à
+chaque mesure en O(1). Une excursion commence quand la température dépasse
+le seuil haut (ou passe sous le seuil bas, s'il est défini) et ne se
+termine qu'une fois revenue de `hysteresis_c` dans la plage : une mesure
+qui oscille autour du seuil ne produit pas une rafale d'alertes.
+
+update() retourne un événement au début ("start") et à la fin ("end",
+avec durée et température extrême) de chaque excursion, None sinon.
+
+Une mesure plus ancienne que la dernière vue pour le camion (mesure
+binaire horodatée par `age_ms`, arrivée après une plus récente) est
+ignorée et comptée (`late`) : elle ouvrirait ou clorait une excursion
+avant son début, avec une durée négative.
+"""
+import math
+import os
+
+# Same threshold as config/alert_task.flux
+EXCURSION_HIGH_C = float(os.getenv("EXCURSION_HIGH_C", 6.0))
+EXCURSION_LOW_C = float(os.getenv("EXCURSION_LOW_C")) if os.getenv("EXCURSION_LOW_C") else None
+EXCURSION_HYSTERESIS_C = float(os.getenv("EXCURSION_HYSTERESIS_C", 0.5))
+
+EXCURSION_TOPIC = "truck/{truck_id}/excursion"
+EXCURSION_MEASUREMENT = "excursion"
+
+
+class _TruckState:
+    __slots__ = ("kind", "started_ns", "peak", "readings", "last_ns")
+
+    def __init__(self):
+        self.kind = None  # None, "high" or "low"
+        self.started_ns = 0
+        self.peak = 0.0
+        self.readings = 0
+        self.last_ns = None
+
+
+class ExcursionDetector:
+    def __init__(self, high_c=EXCURSION_HIGH_C, low_c=EXCURSION_LOW_C, hysteresis_c=EXCURSION_HYSTERESIS_C):
+        self.high_c = high_c
+        self.low_c = low_c
+        self.hysteresis_c = hysteresis_c
+        self._trucks = {}
+        self.started = 0
+        self.ended = 0
+        self.late = 0
+
+    def update(self, truck_id, temp, timestamp_ns):
+        """Prend en compte une mesure ; retourne l'événement produit ou None."""
+        if temp is None:
+            return None
+        temp = float(temp)
+        if not math.isfinite(temp):
+            return None
+        state = self._trucks.get(truck_id)
+        if state is None:
+            state = self._trucks[truck_id] = _TruckState()
+        if state.last_ns is not None and timestamp_ns < state.last_ns:
+            self.late += 1
+            return None
+        state.last_ns = timestamp_ns
+
+        if state.kind is None:
+            if self.high_c is not None and temp > self.high_c:
+                return self._start(truck_id, state, "high", temp, timestamp_ns)
+            if self.low_c is not None and temp < self.low_c:
+                return self._start(truck_id, state, "low", temp, timestamp_ns)
+            return None
+
+        state.readings += 1
+        if state.kind == "high":
+            state.peak = max(state.peak, temp)
+            if temp <= self.high_c - self.hysteresis_c:
+                return self._end(truck_id, state, temp, timestamp_ns)
+        else:
+            state.peak = min(state.peak, temp)
+            if temp >= self.low_c + self.hysteresis_c:
+                return self._end(truck_id, state, temp, timestamp_ns)
+        return None
+
+    def _start(self, truck_id, state, kind, temp, timestamp_ns):
+        state.kind = kind
+        state.started_ns = timestamp_ns
+        state.peak = temp
+        state.readings = 1
+        self.started += 1
+        return self._event(truck_id, state, "start", temp, timestamp_ns)
+
+    def _end(self, truck_id, state, temp, timestamp_ns):
+        event = self._event(truck_id, state, "end", temp, timestamp_ns)
+        state.kind = None
+        self.ended += 1
+        return event
+
+    def _event(self, truck_id, state, event, temp, timestamp_ns):
+        return {
+            "truck_id": truck_id,
+            "event": event,
+            "kind": state.kind,
+            "threshold": self.high_c if state.kind == "high" else self.low_c,
+            "temp": temp,
+            "peak_temp": state.peak,
+            "started_ns": state.started_ns,
+            "timestamp_ns": timestamp_ns,
+            "duration_s": round((timestamp_ns - state.started_ns) / 1e9, 3),
+            "readings": state.readings,
+        }
+
+    def open_excursions(self):
+        """Camions actuellement en excursion."""
+        return [truck_id for truck_id, state in self._trucks.items() if state.kind is not None]
+
+    def stats(self):
+        return {"trucks": len(self._trucks), "started": self.started, "ended": self.ended,
+                "open": self.started - self.ended, "late": self.late}
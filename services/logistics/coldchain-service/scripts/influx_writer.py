@@ -0,0 +1,308 @@
+"""
+Écriture par lots vers InfluxDB pour le pont MQTT -> InfluxDB.
+
+Les mesures sont converties directement en line protocol et mises en
+tampon ; un thread d'écriture les envoie par lots (une requête HTTP par
+lot) dès que `batch_size` lignes sont prêtes ou que `flush_interval_s` est
+écoulé. Le callback MQTT ne fait qu'un ajout en mémoire et ne bloque
+jamais la boucle réseau paho.
+
+Avec un Spool (spool.py), un lot qui ne peut être écrit (base injoignable
+ou trop lente : délai INFLUX_WRITE_TIMEOUT_MS dépassé) part sur disque ;
+tant que le spool n'est pas vide, les nouveaux lots y sont ajoutés aussi
+et le tout est rejoué par gros blocs, dans l'ordre, dès que la base répond.
+
+Seules les pannes passagères (connexion, délai, HTTP 5xx et 429) sont
+retentées. Un lot refusé (autre 4xx : line protocol invalide, 422 hors
+rétention, ...) ne passerait jamais : il est coupé en deux jusqu'à isoler
+les lignes fautives, qui partent dans un fichier de dead letter
+(`dead-letter.lp` du spool) et sont journalisées ; le reste est écrit.
+"""
+import functools
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from influxdb_client import InfluxDBClient, WritePrecision
+from influxdb_client.client.write_api import SYNCHRONOUS
+
+from sampled_log import SampledLog
+
+BATCH_SIZE = int(os.getenv("INFLUX_BATCH_SIZE", 5000))
+FLUSH_INTERVAL_S = float(os.getenv("INFLUX_FLUSH_INTERVAL_S", 1.0))
+MAX_BUFFERED_LINES = int(os.getenv("INFLUX_MAX_BUFFERED_LINES", 500_000))
+WRITE_TIMEOUT_MS = int(os.getenv("INFLUX_WRITE_TIMEOUT_MS", 10_000))
+REPLAY_CHUNK_BYTES = int(os.getenv("INFLUX_REPLAY_CHUNK_KB", 4096)) * 1024
+RETRY_BACKOFF_S = (0.5, 1, 2, 5, 10)
+DEAD_LETTER_FILE = "dead-letter.lp"
+
+
+# Line protocol has no escape for line breaks: a "\n" in a tag value (from the
+# MQTT topic) would split the line and fail the whole batch. They are removed.
+_LINE_BREAKS = str.maketrans("", "", "\r\n")
+
+
+# Tag values, keys and measurements repeat (a few thousand trucks): escape each once
+@functools.lru_cache(maxsize=65536)
+def _escape_key(value):
+    value = str(value).translate(_LINE_BREAKS)
+    return value.replace("\\", "\\\\").replace(",", "\\,").replace("=", "\\=").replace(" ", "\\ ")
+
+
+@functools.lru_cache(maxsize=256)
+def _escape_measurement(value):
+    value = str(value).translate(_LINE_BREAKS)
+    return value.replace("\\", "\\\\").replace(",", "\\,").replace(" ", "\\ ")
+
+
+def line_protocol(measurement, tags, fields, timestamp_ns):
+    """
+    Une ligne de line protocol (champs flottants, précision ns). Les champs
+    absents (None) ou non finis sont ignorés ; None si aucun champ ne reste.
+    """
+    parts = []
+    for key, value in fields.items():
+        if value is None:
+            continue
+        value = float(value)
+        if math.isfinite(value):
+            parts.append(f"{_escape_key(key)}={value!r}")
+    if not parts:
+        return None
+    field_set = ",".join(parts)
+    tag_set = "".join(f",{_escape_key(key)}={_escape_key(value)}" for key, value in sorted(tags.items()))
+    return f"{_escape_measurement(measurement)}{tag_set} {field_set} {int(timestamp_ns)}"
+
+
+def _status(error):
+    """Code HTTP d'une erreur d'écriture (ApiException d'influxdb_client, httpx) ; None sans réponse."""
+    status = getattr(error, "status", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def retryable(error):
+    """Vrai si l'écriture peut réussir plus tard : pas de réponse (connexion, délai), 5xx ou 429."""
+    status = _status(error)
+    return status is None or status >= 500 or status == 429
+
+
+def influx_sink(url, token, org, bucket):
+    """Fonction d'écriture d'un lot de lignes (une requête /api/v2/write)."""
+    client = InfluxDBClient(url=url, token=token, org=org, timeout=WRITE_TIMEOUT_MS)
+    write_api = client.write_api(write_options=SYNCHRONOUS)
+
+    def write(lines):
+        write_api.write(bucket=bucket, org=org, record="\n".join(lines),
+                        write_precision=WritePrecision.NS)
+
+    write.close = client.close
+    return write
+
+
+class BatchWriter:
+    """
+    Tampon borné de lignes + thread d'écriture par lots.
+
+    `write(lines)` envoie un lot et lève une exception en cas d'échec. Sur
+    une panne passagère (retryable), le lot est confié au `spool` s'il y en
+    a un, sinon remis en tête du tampon, et la base n'est recontactée
+    qu'après un délai croissant (RETRY_BACKOFF_S). Un lot refusé est coupé
+    jusqu'à isoler les lignes fautives, ajoutées à `dead_letter` (par
+    défaut dans le répertoire du spool) et comptées dans `rejected`.
+    Au-delà de `max_buffered` lignes en attente, les plus anciennes sont
+    abandonnées (compteur `dropped`).
+    """
+
+    def __init__(self, write, batch_size=BATCH_SIZE, flush_interval_s=FLUSH_INTERVAL_S,
+                 max_buffered=MAX_BUFFERED_LINES, spool=None, dead_letter=None, log=None):
+        self._write = write
+        self.spool = spool
+        if dead_letter is None and spool is not None:
+            dead_letter = os.path.join(spool.directory, DEAD_LETTER_FILE)
+        self.dead_letter = dead_letter
+        self.log = log or SampledLog("influx-writer")
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.max_buffered = max_buffered
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._closing = False
+        self._flush_now = False
+        self._thread = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self.received = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+        self.rejected = 0
+        self.last_error = None
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="influx-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def add(self, line, urgent=False):
+        """
+        Ajoute une ligne (non bloquant, appelé depuis le callback MQTT).
+        `urgent` : envoie le tampon sans attendre `flush_interval_s` (alertes).
+        """
+        with self._cond:
+            self._buffer.append(line)
+            self.received += 1
+            if len(self._buffer) > self.max_buffered:
+                self._buffer.popleft()
+                self.dropped += 1
+            if urgent:
+                self._flush_now = True
+                self._cond.notify()
+            elif len(self._buffer) == self.batch_size:
+                self._cond.notify()
+
+    def _next_batch(self, timeout, limit):
+        with self._cond:
+            self._cond.wait_for(
+                lambda: len(self._buffer) >= self.batch_size or self._flush_now or self._closing,
+                timeout=timeout,
+            )
+            self._flush_now = False
+            count = min(len(self._buffer), limit)
+            return [self._buffer.popleft() for _ in range(count)]
+
+    def _requeue(self, batch):
+        with self._cond:
+            self._buffer.extendleft(reversed(batch))
+            while len(self._buffer) > self.max_buffered:
+                self._buffer.popleft()
+                self.dropped += 1
+
+    def _send(self, lines):
+        """
+        Écrit un lot : None s'il est écrit, sinon l'exception. Une panne
+        passagère programme aussi la prochaine tentative.
+        """
+        started = time.perf_counter()
+        try:
+            self._write(lines)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e)
+            if retryable(e):
+                self._retry_at = time.monotonic() + RETRY_BACKOFF_S[
+                    min(self._failures, len(RETRY_BACKOFF_S) - 1)
+                ]
+                self._failures += 1
+            return e
+        self._failures = 0
+        self.last_flush_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.written += len(lines)
+        self.batches += 1
+        return None
+
+    def _deliver(self, lines):
+        """
+        Écrit `lines`, en coupant un lot refusé en deux jusqu'à isoler les
+        lignes fautives (~2·log2(n) requêtes par ligne). Retourne les lignes
+        encore à écrire après une panne passagère, dans l'ordre (liste vide :
+        tout est écrit ou en dead letter).
+        """
+        error = self._send(lines)
+        if error is None:
+            return []
+        if retryable(error):
+            return lines
+        if len(lines) == 1:
+            self._reject(lines[0], error)
+            return []
+        middle = len(lines) // 2
+        pending = self._deliver(lines[:middle])
+        if pending:
+            return pending + lines[middle:]
+        return self._deliver(lines[middle:])
+
+    def _reject(self, line, error):
+        self.rejected += 1
+        self.log.sampled("error", "line_rejected", status=_status(error), error=str(error)[:200],
+                         line=line[:200], dead_letter=self.dead_letter)
+        if self.dead_letter is not None:
+            with open(self.dead_letter, "a") as f:
+                f.write(line + "\n")
+
+    def _replay(self):
+        """Rejoue un bloc du spool (le plus ancien d'abord)."""
+        lines, (segment, end) = self.spool.read(REPLAY_CHUNK_BYTES)
+        if not lines:
+            return
+        pending = self._deliver(lines)
+        if len(pending) < len(lines):
+            # Commit up to the first line still pending: each line is its bytes plus "\n"
+            end -= sum(len(line.encode()) + 1 for line in pending)
+            self.spool.commit((segment, end), len(lines) - len(pending))
+
+    def _run(self):
+        while True:
+            backlog = self.spool is not None and len(self.spool) > 0
+            database_up = time.monotonic() >= self._retry_at
+            spooling = self.spool is not None and (backlog or not database_up)
+            if spooling:
+                # Move everything to disk; while replaying, do not wait for more
+                batch = self._next_batch(0 if database_up else self.flush_interval_s, self.max_buffered)
+            else:
+                batch = self._next_batch(self.flush_interval_s, self.batch_size)
+
+            if spooling:
+                # Keep arrival order: new data queues behind the spooled backlog
+                if batch:
+                    self.spool.append(batch)
+                if database_up and not self._closing:
+                    self._replay()
+            elif batch:
+                pending = self._deliver(batch)
+                if pending and self.spool is not None:
+                    self.spool.append(pending)
+                elif pending:
+                    self._requeue(pending)
+                    if not self._closing:
+                        time.sleep(max(0.0, self._retry_at - time.monotonic()))
+
+            if self._closing:
+                with self._cond:
+                    empty = not self._buffer
+                if empty or (self.spool is None and time.monotonic() < self._retry_at):
+                    return  # close() gives up on an unreachable database without a spool
+
+    def close(self, timeout=10):
+        """Vide le tampon (au plus `timeout` s) puis arrête le thread."""
+        with self._cond:
+            self._closing = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        close = getattr(self._write, "close", None)
+        if close is not None:
+            close()
+        if self.spool is not None:
+            self.spool.close()
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "written": self.written,
+            "batches": self.batches,
+            "buffered": len(self._buffer),
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "dead_letter": self.dead_letter,
+            "last_error": self.last_error,
+            "last_flush_ms": self.last_flush_ms,
+            "spool": self.spool.stats() if self.spool is not None else None,
+        }
@@ -0,0 +1,368 @@
+"""
+Ingestion MQTT -> InfluxDB sur plusieurs processus (un par cœur par défaut).
+
+Un superviseur lance N workers ; chacun a son BatchWriter et son spool
+(`<COLDCHAIN_SPOOL_DIR>/worker-<i>`), et le superviseur relance (avec un
+délai croissant) tout worker qui s'arrête.
+
+Répartition des camions :
+- `hash` (défaut) : une seule connexion MQTT, dans le superviseur
+  (Receiver), abonnée à truck/+/telemetry. Chaque message est routé sans
+  être décodé, d'après le topic, vers la file du worker crc32(truck_id) % N,
+  par lots (INGEST_FANOUT_BATCH messages ou INGEST_FANOUT_FLUSH_MS). Le
+  broker n'envoie chaque message qu'une fois, et un camion est toujours
+  traité par le même worker, dans l'ordre d'arrivée. Les workers n'ont
+  qu'une connexion de publication (alertes d'excursion). Une file pleine
+  (worker arrêté ou trop lent) bloque la réception : le broker garde
+  alors les messages QoS 1 de la session du Receiver.
+- `shared` : abonnement partagé `$share/<groupe>/truck/+/telemetry`, une
+  connexion par worker. Mosquitto répartit message par message : deux
+  mesures d'un même camion peuvent passer par deux workers et l'ordre
+  n'est plus garanti. À réserver à un broker qui répartit par topic (EMQX :
+  broker.shared_subscription_strategy = hash_topic) : la détection
+  d'excursions suppose elle aussi qu'un camion reste sur un seul worker.
+
+Les connexions abonnées ont une session persistante (client id fixe,
+clean_session False) : pendant un redémarrage, le broker garde les
+messages QoS 1. À l'arrêt (SIGTERM ou Ctrl+C), le Receiver se déconnecte
+et les workers vident leur file puis leur tampon avant de s'arrêter.
+
+Usage (depuis services/logistics/coldchain-service) :
+    python scripts/ingest_workers.py --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import zlib
+from collections import namedtuple
+from queue import Empty, Full
+
+import mqtt_to_influx as bridge
+from excursions import ExcursionDetector
+from influx_writer import BatchWriter, influx_sink
+from rollups import Rollups
+from sampled_log import SampledLog
+from spool import SPOOL_DIR, Spool
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+INGEST_MODE = os.getenv("INGEST_MODE", "hash")
+INGEST_QOS = int(os.getenv("INGEST_QOS", 1))
+SHARE_GROUP = os.getenv("INGEST_SHARE_GROUP", "coldchain-ingest")
+CLIENT_ID_PREFIX = os.getenv("INGEST_CLIENT_ID_PREFIX", "coldchain-ingest")
+FANOUT_BATCH = int(os.getenv("INGEST_FANOUT_BATCH", 500))
+FANOUT_FLUSH_S = float(os.getenv("INGEST_FANOUT_FLUSH_MS", 20)) / 1000
+# Batches waiting per worker before the receiver blocks
+FANOUT_QUEUE_BATCHES = int(os.getenv("INGEST_FANOUT_QUEUE_BATCHES", 1000))
+
+RESTART_BACKOFF_S = (1, 2, 5, 10, 30)
+# A worker alive this long is considered healthy again
+RESTART_RESET_S = 60
+SHUTDOWN_TIMEOUT_S = 15
+
+# What bridge.on_message needs from a paho message
+Message = namedtuple("Message", "topic payload")
+
+
+def shard_of(truck_id, workers):
+    """Index du worker d'un camion (stable d'un processus à l'autre, contrairement à hash())."""
+    return zlib.crc32(truck_id.encode()) % workers
+
+
+class Shard(bridge.BridgeState):
+    """État d'un worker, passé en userdata au client paho."""
+
+    def __init__(self, index, workers, mode, writer, detector=None, rollups=None, state_dir=None, scorer=None):
+        super().__init__(writer, detector, rollups, state_dir, SampledLog(f"ingest-worker-{index}"), scorer)
+        self.index = index
+        self.workers = workers
+        self.mode = mode
+
+    @property
+    def topic(self):
+        """Abonnement du worker (mode `shared`) ; None : messages reçus du Receiver."""
+        if self.mode == "shared":
+            return f"$share/{SHARE_GROUP}/{bridge.MQTT_TOPIC}"
+        return None
+
+    def stats(self):
+        return {"worker": self.index, **super().stats()}
+
+
+def on_connect(client, shard, flags, rc, properties=None):
+    shard.log.info("mqtt_connected", broker=bridge.MQTT_BROKER, result=str(rc), topic=shard.topic)
+    if shard.topic is not None:
+        client.subscribe(shard.topic, qos=INGEST_QOS)
+
+
+class Receiver:
+    """
+    Connexion MQTT unique du mode `hash` (thread paho du superviseur) :
+    route chaque message vers la file multiprocessing de son worker.
+    """
+
+    def __init__(self, queues):
+        self.queues = queues
+        self._pending = [[] for _ in queues]
+        self._shards = {}
+        # Held while a batch is put: keeps batches of a worker in order
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._flusher = None
+        self.received = 0
+        self.forwarded = [0] * len(queues)
+        self.log = SampledLog("ingest-receiver")
+        self.client = bridge.mqtt_client(self, client_id=f"{CLIENT_ID_PREFIX}-receiver", clean_session=False)
+        self.client.on_connect = self._on_connect
+        self.client.on_message = self._on_message
+
+    def _on_connect(self, client, userdata, flags, rc, properties=None):
+        self.log.info("mqtt_connected", broker=bridge.MQTT_BROKER, result=str(rc), topic=bridge.MQTT_TOPIC)
+        client.subscribe(bridge.MQTT_TOPIC, qos=INGEST_QOS)
+
+    def _on_message(self, client, userdata, msg):
+        truck_id = msg.topic.split('/', 2)[1]
+        index = self._shards.get(truck_id)
+        if index is None:
+            index = self._shards[truck_id] = shard_of(truck_id, len(self.queues))
+        with self._lock:
+            self.received += 1
+            pending = self._pending[index]
+            pending.append((msg.topic, msg.payload))
+            if len(pending) >= FANOUT_BATCH:
+                self._put(index)
+
+    def _put(self, index):
+        batch, self._pending[index] = self._pending[index], []
+        while True:
+            try:
+                self.queues[index].put(batch, timeout=1)
+                break
+            except Full:
+                if self._stop.is_set():
+                    # Shutting down with that worker gone: nobody will read it
+                    self.log.error("fanout_dropped", worker=index, messages=len(batch))
+                    return
+        self.forwarded[index] += len(batch)
+
+    def flush(self):
+        """Envoie les lots en cours (toutes les FANOUT_FLUSH_S secondes, et à l'arrêt)."""
+        with self._lock:
+            for index, pending in enumerate(self._pending):
+                if pending:
+                    self._put(index)
+
+    def _flush_loop(self):
+        while not self._stop.wait(FANOUT_FLUSH_S):
+            self.flush()
+
+    def start(self):
+        self.client.connect(bridge.MQTT_BROKER, bridge.MQTT_PORT, 60)
+        self.client.loop_start()
+        self._flusher = threading.Thread(target=self._flush_loop, name="ingest-fanout", daemon=True)
+        self._flusher.start()
+        return self
+
+    def stop(self):
+        """Arrête la réception et envoie ce qui a déjà été reçu."""
+        self._stop.set()
+        self.client.loop_stop()
+        self.client.disconnect()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+
+    def stats(self):
+        return {"received": self.received, "forwarded": list(self.forwarded), "trucks": len(self._shards)}
+
+
+def _consume(client, shard, queue, stats_interval_s):
+    """Traite les lots routés par le Receiver jusqu'au lot None (arrêt)."""
+    next_stats = time.monotonic() + stats_interval_s
+    while True:
+        try:
+            batch = queue.get(timeout=max(0.0, next_stats - time.monotonic()))
+        except Empty:
+            batch = ()
+        if batch is None:
+            return
+        for topic, payload in batch:
+            bridge.on_message(client, shard, Message(topic, payload))
+        if time.monotonic() >= next_stats:
+            next_stats = time.monotonic() + stats_interval_s
+            shard.log.info("stats", **shard.stats())
+
+
+def _terminate(signum, frame):
+    raise KeyboardInterrupt
+
+
+def run_worker(index, workers, mode, stats_interval_s, queue=None):
+    """
+    Point d'entrée d'un processus worker. Avec `queue` (mode `hash`), traite
+    les messages du Receiver jusqu'au lot None ; sinon s'abonne lui-même.
+    SIGTERM vide le tampon du BatchWriter avant l'arrêt.
+    """
+    # Ctrl+C reaches the whole process group: let the supervisor stop workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, _terminate)
+    state_dir = os.path.join(SPOOL_DIR, f"worker-{index}")
+    writer = BatchWriter(
+        influx_sink(bridge.INFLUX_URL, bridge.INFLUX_TOKEN, bridge.INFLUX_ORG, bridge.INFLUX_BUCKET),
+        spool=Spool(state_dir),
+    ).start()
+    shard = Shard(index, workers, mode, writer, ExcursionDetector(), Rollups(bridge.MEASUREMENT), state_dir,
+                  bridge.failure_scorer(writer))
+    # Publish-only connections need no session (this also drops the subscription
+    # left by a worker of an earlier version under the same client id)
+    client = bridge.mqtt_client(shard, client_id=f"{CLIENT_ID_PREFIX}-{index}", clean_session=queue is not None)
+    client.on_connect = on_connect
+    try:
+        client.connect(bridge.MQTT_BROKER, bridge.MQTT_PORT, 60)
+        client.loop_start()
+        if queue is not None:
+            _consume(client, shard, queue, stats_interval_s)
+        else:
+            while True:
+                time.sleep(stats_interval_s)
+                shard.log.info("stats", **shard.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        client.loop_stop()
+        client.disconnect()
+        shard.close()
+        shard.log.info("stopped", **shard.stats())
+
+
+class Supervisor:
+    """Lance les workers et relance ceux qui s'arrêtent."""
+
+    def __init__(self, workers=INGEST_WORKERS, mode=INGEST_MODE, stats_interval_s=bridge.STATS_INTERVAL_S):
+        self.workers = workers
+        self.mode = mode
+        self.stats_interval_s = stats_interval_s
+        self._context = multiprocessing.get_context("spawn")
+        # hash mode: one queue per worker, kept across worker restarts
+        self._queues = [self._context.Queue(FANOUT_QUEUE_BATCHES) if mode == "hash" else None
+                        for _ in range(workers)]
+        self.receiver = Receiver(self._queues) if mode == "hash" else None
+        self._processes = [None] * workers
+        self._started_at = [0.0] * workers
+        self._failures = [0] * workers
+        self._restart_at = [0.0] * workers
+        self.restarts = 0
+        self._stopping = False
+        self.log = SampledLog("ingest-supervisor")
+
+    def _start(self, index):
+        process = self._context.Process(
+            target=run_worker, args=(index, self.workers, self.mode, self.stats_interval_s, self._queues[index]),
+            name=f"ingest-worker-{index}",
+        )
+        process.start()
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+
+    def _check(self, index):
+        process = self._processes[index]
+        now = time.monotonic()
+        if process is not None and process.is_alive():
+            if now - self._started_at[index] >= RESTART_RESET_S:
+                self._failures[index] = 0
+            return
+        if process is not None:
+            # Worker died: schedule a restart with a growing delay
+            delay = RESTART_BACKOFF_S[min(self._failures[index], len(RESTART_BACKOFF_S) - 1)]
+            self.log.error("worker_exited", worker=index, exitcode=process.exitcode, restart_in_s=delay)
+            self._failures[index] += 1
+            self._restart_at[index] = now + delay
+            self._processes[index] = None
+        elif now >= self._restart_at[index]:
+            self._start(index)
+            self.restarts += 1
+
+    def _orphan_spools(self):
+        """Spools laissés par des workers d'indice >= N (N réduit) : jamais rejoués."""
+        if not os.path.isdir(SPOOL_DIR):
+            return []
+        return [
+            name for name in os.listdir(SPOOL_DIR)
+            if name.startswith("worker-") and name[7:].isdigit() and int(name[7:]) >= self.workers
+            and any(f.endswith(".seg") for f in os.listdir(os.path.join(SPOOL_DIR, name)))
+        ]
+
+    def run(self):
+        for name in self._orphan_spools():
+            self.log.error("orphan_spool", path=os.path.join(SPOOL_DIR, name),
+                           hint="run with more workers to drain it")
+        self.log.info("starting", workers=self.workers, mode=self.mode)
+        for index in range(self.workers):
+            self._start(index)
+        try:
+            if self.receiver is not None:
+                self.receiver.start()
+            next_stats = time.monotonic() + self.stats_interval_s
+            while not self._stopping:
+                time.sleep(1)
+                for index in range(self.workers):
+                    self._check(index)
+                if self.receiver is not None and time.monotonic() >= next_stats:
+                    next_stats = time.monotonic() + self.stats_interval_s
+                    self.log.info("stats", restarts=self.restarts, **self.receiver.stats())
+        finally:
+            self.stop()
+
+    def stop(self):
+        """
+        Arrêt propre. Mode `hash` : le Receiver se déconnecte et chaque worker
+        reçoit un lot None après ses derniers messages ; mode `shared` :
+        SIGTERM. Les workers vident alors leur tampon ; kill au-delà de
+        SHUTDOWN_TIMEOUT_S.
+        """
+        if self._stopping:
+            return
+        self._stopping = True
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        alive = [p for p in self._processes if p is not None and p.is_alive()]
+        if self.receiver is not None:
+            self.receiver.stop()
+            for queue in self._queues:
+                try:
+                    queue.put(None, timeout=1)
+                except Full:
+                    pass  # worker gone: killed below
+        else:
+            for process in alive:
+                process.terminate()
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT_S
+        for process in alive:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                process.kill()
+        for queue in self._queues:
+            if queue is not None:
+                # Batches for a worker that is gone would block the exit
+                queue.cancel_join_thread()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument("--mode", choices=("hash", "shared"), default=INGEST_MODE)
+    parser.add_argument("--stats-interval-s", type=float, default=bridge.STATS_INTERVAL_S)
+    args = parser.parse_args()
+
+    supervisor = Supervisor(args.workers, args.mode, args.stats_interval_s)
+    signal.signal(signal.SIGTERM, _terminate)
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Générateur de charge : des milliers de camions frigorifiques simulés publient
+leur télémétrie (truck/<id>/telemetry) sur un broker local.
+
+Chaque camion envoie une mesure toutes les `--interval-s` secondes :
+température autour de sa consigne (marche aléatoire, ouvertures de porte
+occasionnelles), humidité et, en JSON, vibration et pression de gaz du
+compresseur (qui se met en marche quand la caisse se réchauffe). Le champ `seq` (ignoré par le pont) numérote
+les mesures d'un camion pour vérifier l'ordre côté consommateur
+(`--payload binary` : format binaire compact de payloads.py, sans seq). Les
+camions sont répartis sur `--publishers` processus, chacun avec sa
+connexion MQTT.
+
+Usage (depuis services/logistics/coldchain-service, broker sur localhost) :
+    python scripts/load_generator.py --trucks 5000 --interval-s 1 --duration-s 60
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import paho.mqtt.client as mqtt
+
+from payloads import encode_binary
+
+MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost")
+MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
+
+DOOR_OPEN_PROBABILITY = 0.002
+DOOR_OPEN_HEAT_C = 4.0
+# Messages handed to paho but not yet acknowledged (QoS 1) or sent (QoS 0):
+# beyond this the publisher waits, so a slow broker shows up as lateness
+MAX_PENDING = 2000
+
+
+class SimulatedTruck:
+    def __init__(self, truck_id, rng):
+        self.topic = f"truck/{truck_id}/telemetry"
+        self.rng = rng
+        self.setpoint = rng.choice((-18.0, 2.0, 3.0, 4.0))
+        self.temp = self.setpoint + rng.uniform(-0.5, 0.5)
+        self.humidity = rng.uniform(80, 95)
+        self.gas_pressure = rng.gauss(150, 15)
+        self.compressor_on = False
+        self.seq = 0
+
+    def reading(self, payload="json"):
+        rng = self.rng
+        # Random walk pulled back to the setpoint by the reefer unit
+        self.temp += 0.2 * (self.setpoint - self.temp) + rng.gauss(0, 0.1)
+        if rng.random() < DOOR_OPEN_PROBABILITY:
+            self.temp += DOOR_OPEN_HEAT_C
+        self.humidity = min(100.0, max(50.0, self.humidity + rng.gauss(0, 0.3)))
+        # Thermostat with a small dead band
+        if self.temp > self.setpoint + 0.3:
+            self.compressor_on = True
+        elif self.temp < self.setpoint - 0.3:
+            self.compressor_on = False
+        self.seq += 1
+        if payload == "binary":
+            return encode_binary([(round(self.temp, 2), round(self.humidity, 1), 0)])
+        vibration = rng.gauss(0.5, 0.1) if self.compressor_on else abs(rng.gauss(0, 0.02))
+        return json.dumps({"temp": round(self.temp, 2), "humidity": round(self.humidity, 1),
+                           "vibration": round(vibration, 3),
+                           "gas_pressure": round(self.gas_pressure + rng.gauss(0, 1), 1), "seq": self.seq})
+
+
+def _on_publish(client, acked, mid, *args):
+    acked[0] += 1
+
+
+def _client(index, acked):
+    if hasattr(mqtt, "CallbackAPIVersion"):
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=f"coldchain-loadgen-{index}",
+                             userdata=acked)
+    else:
+        client = mqtt.Client(client_id=f"coldchain-loadgen-{index}", userdata=acked)
+    client.on_publish = _on_publish
+    client.max_inflight_messages_set(MAX_PENDING)
+    return client
+
+
+def publish(index, truck_ids, args):
+    """Boucle d'un processus publieur : un tour = une mesure par camion."""
+    rng = random.Random(args.seed * 1000 + index)
+    trucks = [SimulatedTruck(truck_id, rng) for truck_id in truck_ids]
+    acked = [0]
+    client = _client(index, acked)
+    client.connect(args.broker, args.port, 60)
+    client.loop_start()
+
+    published = 0
+    late_ticks = 0
+    start = time.monotonic()
+    next_tick = start
+    while next_tick - start < args.duration_s:
+        for truck in trucks:
+            while published - acked[0] >= MAX_PENDING:
+                time.sleep(0.001)
+            client.publish(truck.topic, truck.reading(args.payload), qos=args.qos)
+            published += 1
+        next_tick += args.interval_s
+        wait = next_tick - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        else:
+            late_ticks += 1
+    deadline = time.monotonic() + 30
+    while acked[0] < published and time.monotonic() < deadline:
+        time.sleep(0.01)
+    client.disconnect()
+    client.loop_stop()
+    return acked[0], late_ticks, time.monotonic() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--broker", default=MQTT_BROKER)
+    parser.add_argument("--port", type=int, default=MQTT_PORT)
+    parser.add_argument("--trucks", type=int, default=5000)
+    parser.add_argument("--interval-s", type=float, default=1.0)
+    parser.add_argument("--duration-s", type=float, default=60.0)
+    parser.add_argument("--publishers", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--qos", type=int, choices=(0, 1), default=1)
+    parser.add_argument("--payload", choices=("json", "binary"), default="json")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    truck_ids = [f"TRK-{i:05d}" for i in range(args.trucks)]
+    print(f"{args.trucks} trucks, one reading every {args.interval_s}s each "
+          f"(target {args.trucks / args.interval_s:.0f} msg/s), {args.publishers} publishers")
+    with ProcessPoolExecutor(args.publishers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(publish, i, truck_ids[i::args.publishers], args)
+                   for i in range(args.publishers)]
+        totals = [future.result() for future in futures]
+
+    published = sum(t[0] for t in totals)  # acknowledged by the broker
+    elapsed = max(t[2] for t in totals)
+    late = sum(t[1] for t in totals)
+    print(f"published {published} messages in {elapsed:.1f}s ({published / elapsed:.0f} msg/s)"
+          + (f", {late} ticks behind schedule" if late else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,239 @@
-import paho.mqtt.client as mqtt
+"""
+Pont MQTT -> InfluxDB pour la télémétrie des camions frigorifiques.
+
+Chaque message `truck/<id>/telemetry` (JSON {"temp": ..., "humidity": ...},
+ou format binaire compact / MessagePack, voir payloads.py) est converti en
+lignes de line protocol confiées au BatchWriter, qui écrit par lots en
+arrière-plan : le callback paho ne fait aucune E/S réseau. Les erreurs par
+message sont journalisées en JSON, échantillonnées (sampled_log.py).
+Si InfluxDB est injoignable ou trop lent, les lectures sont conservées
+dans un spool disque (spool.py) puis rejouées dans l'ordre : aucune
+mesure n'est perdue pour le certificat de trajet.
+
+Les excursions de température sont détectées au fil de l'eau
+(excursions.py) : chaque début et fin d'excursion est publié aussitôt sur
+`truck/<id>/excursion` et écrit dans la mesure `excursion` sans attendre
+le prochain lot. Des agrégats 1 min / 15 min par camion (rollups.py) sont
+écrits dans `telemetry_1m` et `telemetry_15m` pour les vues longues.
+
+Avec FAILURE_SCORING=1 (nécessite scikit-learn), les features de
+ml/failure_predictor.py sont tenues à jour en continu (ml/feature_engine.py)
+et toute la flotte est scorée toutes les FAILURE_SCORING_INTERVAL_S
+secondes ; les scores sont écrits dans la mesure `failure_risk`. Seuls
+les messages JSON / MessagePack portent la vibration et la pression de
+gaz : un camion qui n'envoie que le format binaire compact n'est jamais
+scoré (stats `failure_scoring` : `trucks` suivis contre `scored`).
+
+Usage : python scripts/mqtt_to_influx.py (configuration par variables
+d'environnement, mêmes noms que docker-compose.yml). Pour répartir
+l'ingestion sur plusieurs cœurs : scripts/ingest_workers.py.
+"""
 import json
+import math
+import os
+import signal
+import sys
 import time
-from influxdb_client import InfluxDBClient, Point, WritePrecision
-from influxdb_client.client.write_api import SYNCHRONOUS
+
+import paho.mqtt.client as mqtt
+
+from excursions import EXCURSION_MEASUREMENT, EXCURSION_TOPIC, ExcursionDetector
+from influx_writer import BatchWriter, influx_sink, line_protocol
+from payloads import decode
+from rollups import ROLLUP_STATE_FILE, Rollups
+from sampled_log import SampledLog
+from spool import SPOOL_DIR, Spool
 
 # Configuration InfluxDB
-INFLUX_URL = "http://localhost:8086"
-INFLUX_TOKEN = "my-super-secret-auth-token"
-INFLUX_ORG = "agrilogistic"
-INFLUX_BUCKET = "cold_chain"
+INFLUX_URL = os.getenv("INFLUXDB_URL", "http://localhost:8086")
+INFLUX_TOKEN = os.getenv("INFLUXDB_TOKEN", "my-super-secret-auth-token")
+INFLUX_ORG = os.getenv("INFLUXDB_ORG", "agrilogistic")
+INFLUX_BUCKET = os.getenv("INFLUXDB_BUCKET", "cold_chain")
 
 # Configuration MQTT
-MQTT_BROKER = "localhost"
+MQTT_BROKER = os.getenv("MQTT_BROKER", "localhost")
+MQTT_PORT = int(os.getenv("MQTT_PORT", 1883))
 MQTT_TOPIC = "truck/+/telemetry"
 
-client_influx = InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG)
-write_api = client_influx.write_api(write_options=SYNCHRONOUS)
+MEASUREMENT = "telemetry"
+STATS_INTERVAL_S = float(os.getenv("BRIDGE_STATS_INTERVAL_S", 60))
+
+FAILURE_SCORING = os.getenv("FAILURE_SCORING", "0") == "1"
+FAILURE_RISK_MEASUREMENT = "failure_risk"
+ML_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ml")
 
-def on_connect(client, userdata, flags, rc):
-    print(f"Connected to MQTT Broker with result code {rc}")
+
+class BridgeState:
+    """
+    État partagé par les callbacks paho (userdata du client). Les fenêtres
+    d'agrégats en cours sont reprises depuis / sauvegardées dans `state_dir`.
+    """
+
+    def __init__(self, writer, detector=None, rollups=None, state_dir=None, log=None, scorer=None):
+        self.writer = writer
+        self.detector = detector
+        self.rollups = rollups
+        self.log = log or SampledLog("bridge")
+        self.scorer = scorer
+        self.features = scorer.engine if scorer is not None else None
+        self._rollup_state = os.path.join(state_dir, ROLLUP_STATE_FILE) if state_dir else None
+        if rollups is not None and self._rollup_state is not None:
+            rollups.load(self._rollup_state)
+
+    def close(self):
+        """Écrit les agrégats échus, sauvegarde les fenêtres en cours, vide le writer."""
+        if self.scorer is not None:
+            self.scorer.stop()
+        if self.rollups is not None:
+            for line in self.rollups.expire(time.time_ns()):
+                self.writer.add(line)
+            if self._rollup_state is not None:
+                self.rollups.save(self._rollup_state)
+        self.writer.close()  # unwritten readings end up in the spool
+
+    def stats(self):
+        stats = self.writer.stats()
+        if self.detector is not None:
+            stats["excursions"] = self.detector.stats()
+        if self.rollups is not None:
+            stats["rollups"] = self.rollups.stats()
+        if self.scorer is not None:
+            stats["failure_scoring"] = self.scorer.stats()
+        return stats
+
+
+def on_connect(client, state, flags, rc, properties=None):
+    state.log.info("mqtt_connected", broker=MQTT_BROKER, result=str(rc), topic=MQTT_TOPIC)
     client.subscribe(MQTT_TOPIC)
 
-def on_message(client, userdata, msg):
+
+def publish_excursion(client, writer, event):
+    """Publie un événement d'excursion (MQTT + mesure Influx, sans attendre le lot)."""
+    if client is not None:
+        client.publish(EXCURSION_TOPIC.format(truck_id=event["truck_id"]), json.dumps(event), qos=1)
+    line = line_protocol(
+        EXCURSION_MEASUREMENT,
+        {"truck_id": event["truck_id"], "kind": event["kind"], "event": event["event"]},
+        {"temperature": event["temp"], "peak_temperature": event["peak_temp"],
+         "threshold": event["threshold"], "duration_s": event["duration_s"]},
+        event["timestamp_ns"],
+    )
+    writer.add(line, urgent=True)
+
+
+def failure_scorer(writer):
+    """
+    FeatureEngine + FleetScorer dont les scores sont écrits dans
+    `failure_risk` (None si FAILURE_SCORING n'est pas activé).
+    """
+    if not FAILURE_SCORING:
+        return None
+    if ML_DIR not in sys.path:
+        sys.path.insert(0, ML_DIR)
+    from failure_predictor import FailurePredictor
+    from feature_engine import FeatureEngine, FleetScorer
+
+    def write_scores(truck_ids, result):
+        now_ns = time.time_ns()
+        for truck_id, probability, critical in zip(truck_ids, result["failure_probability"], result["critical"]):
+            writer.add(line_protocol(FAILURE_RISK_MEASUREMENT, {"truck_id": truck_id},
+                                     {"probability": probability, "critical": float(critical)}, now_ns))
+
+    return FleetScorer(FeatureEngine(), FailurePredictor(), on_scores=write_scores).start()
+
+
+def _number(value):
+    """Valeur d'un capteur en float (les boîtiers JSON envoient parfois "4.2") ; None si absente ou illisible."""
+    if value is None:
+        return None
     try:
-        payload = json.loads(msg.payload.decode())
-        truck_id = msg.topic.split('/')[1]
-        
-        temp = payload.get('temp')
-        humidity = payload.get('humidity')
-        
-        print(f"Truck {truck_id}: Temp={temp}°C, Humidity={humidity}%")
-        
-        # Envoi vers InfluxDB
-        point = Point("telemetry") \
-            .tag("truck_id", truck_id) \
-            .field("temperature", float(temp)) \
-            .field("humidity", float(humidity)) \
-            .time(time.time_ns(), WritePrecision.NS)
-        
-        write_api.write(bucket=INFLUX_BUCKET, record=point)
-        
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def record_reading(client, state, truck_id, temp, humidity, timestamp_ns, vibration=None, gas_pressure=None):
+    """
+    Une mesure : ligne brute, détection d'excursion (en premier : l'alerte
+    ne dépend pas des étapes suivantes), agrégats, features. Les valeurs
+    illisibles sont traitées comme absentes.
+    """
+    raw = (temp, humidity, vibration, gas_pressure)
+    temp, humidity, vibration, gas_pressure = values = [_number(value) for value in raw]
+    if any(value is None and original is not None for value, original in zip(values, raw)):
+        state.log.sampled("error", "bad_value", truck_id=truck_id, values=repr(raw))
+    line = line_protocol(MEASUREMENT, {"truck_id": truck_id},
+                         {"temperature": temp, "humidity": humidity,
+                          "vibration": vibration, "gas_pressure": gas_pressure}, timestamp_ns)
+    if line is not None:
+        state.writer.add(line)
+    if state.detector is not None:
+        event = state.detector.update(truck_id, temp, timestamp_ns)
+        if event is not None:
+            publish_excursion(client, state.writer, event)
+    if state.rollups is not None:
+        for rollup in state.rollups.add(truck_id, {"temperature": temp, "humidity": humidity}, timestamp_ns):
+            state.writer.add(rollup)
+    if state.features is not None:
+        state.features.update(truck_id, timestamp_ns / 1e9, temp, vibration, gas_pressure)
+
+
+def on_message(client, state, msg):
+    try:
+        truck_id = msg.topic.split('/', 2)[1]
+        received_ns = time.time_ns()
+        for temp, humidity, age_ms, vibration, gas_pressure in decode(msg.payload):
+            record_reading(client, state, truck_id, temp, humidity, received_ns - age_ms * 1_000_000,
+                           vibration, gas_pressure)
     except Exception as e:
-        print(f"Error processing message: {e}")
+        state.log.sampled("error", "bad_message", topic=msg.topic, error=repr(e))
+
+
+def mqtt_client(userdata, client_id="", clean_session=True):
+    # paho-mqtt >= 2 requires the callback API version explicitly
+    if hasattr(mqtt, "CallbackAPIVersion"):
+        client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2, client_id=client_id,
+                             clean_session=clean_session, userdata=userdata)
+    else:
+        client = mqtt.Client(client_id=client_id, clean_session=clean_session, userdata=userdata)
+    client.on_connect = on_connect
+    client.on_message = on_message
+    return client
+
 
-# MQTT Client Setup
-mqtt_client = mqtt.Client()
-mqtt_client.on_connect = on_connect
-mqtt_client.on_message = on_message
+def _terminate(signum, frame):
+    raise KeyboardInterrupt
+
+
+def main():
+    # docker stop sends SIGTERM: flush the buffer and save the rollups as for Ctrl+C
+    signal.signal(signal.SIGTERM, _terminate)
+    writer = BatchWriter(
+        influx_sink(INFLUX_URL, INFLUX_TOKEN, INFLUX_ORG, INFLUX_BUCKET),
+        spool=Spool(SPOOL_DIR),
+    ).start()
+    state = BridgeState(writer, ExcursionDetector(), Rollups(MEASUREMENT), SPOOL_DIR,
+                        scorer=failure_scorer(writer))
+    client = mqtt_client(state)
+
+    state.log.info("mqtt_connecting", broker=MQTT_BROKER, port=MQTT_PORT)
+    client.connect(MQTT_BROKER, MQTT_PORT, 60)
+    client.loop_start()
+    try:
+        while True:
+            time.sleep(STATS_INTERVAL_S)
+            # spool.replay_lag_s: age of the oldest reading not yet in InfluxDB
+            state.log.info("stats", **state.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        client.loop_stop()
+        client.disconnect()
+        state.close()
+        state.log.info("stopped", **state.stats())
 
-print(f"Connecting to MQTT Broker at {MQTT_BROKER}...")
-mqtt_client.connect(MQTT_BROKER, 1883, 60)
 
-# Blocking loop
-mqtt_client.loop_forever()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Formats de charge utile de truck/<id>/telemetry.
+
+- JSON (historique) : {"temp": 4.2, "humidity": 85}, plus en option les
+  capteurs du compresseur : "vibration", "gas_pressure"
+- binaire compact : en-tête `<BBH` (0xC1, version, nombre de mesures) puis,
+  par mesure, `<hhI` little-endian : température en centièmes de °C,
+  humidité en dixièmes de %, âge de la mesure en ms au moment de l'envoi
+  (-32768 : valeur absente). 12 octets pour une mesure au lieu d'environ
+  35 en JSON ; un boîtier qui a perdu le réseau peut envoyer ses mesures en
+  retard dans un seul message, l'âge sert à les horodater. Pas de
+  capteurs du compresseur : les camions qui n'envoient que ce format ne
+  sont pas scorés par FAILURE_SCORING (voir mqtt_to_influx.py).
+- MessagePack, si le paquet msgpack est installé : même map que le JSON.
+
+Le premier octet suffit à reconnaître le format : '{' pour le JSON, 0xC1
+(jamais utilisé par MessagePack) pour le binaire, une map MessagePack sinon.
+Un JSON précédé d'espaces ou d'un BOM UTF-8 est accepté : ces octets ne
+commencent jamais une map MessagePack.
+"""
+import json
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+BINARY_MAGIC = 0xC1
+BINARY_VERSION = 1
+HEADER = struct.Struct("<BBH")
+RECORD = struct.Struct("<hhI")
+# The usual message carries one reading: unpack it in a single call
+SINGLE = struct.Struct("<BBHhhI")
+MISSING = -32768
+MAX_RECORDS = 0xFFFF
+JSON_WHITESPACE = b" \t\r\n"
+UTF8_BOM = b"\xef\xbb\xbf"
+
+
+def decode(payload):
+    """
+    Mesures d'un message : liste de (température, humidité, âge_ms,
+    vibration, pression de gaz) ; le format binaire n'a pas les deux derniers.
+    """
+    if not payload:
+        raise ValueError("Empty payload")
+    first = payload[0]
+    if first == BINARY_MAGIC:
+        return _decode_binary(payload)
+    if first in JSON_WHITESPACE or first == UTF8_BOM[0]:
+        payload = payload.removeprefix(UTF8_BOM).lstrip(JSON_WHITESPACE)
+        if not payload:
+            raise ValueError("Blank payload")
+        first = payload[0]
+    if first == 0x7B:  # '{'
+        # json.loads(bytes) sniffs the encoding first: twice as slow
+        data = json.loads(payload.decode())
+    elif msgpack is not None:
+        data = msgpack.unpackb(payload)
+    else:
+        raise ValueError("binary payload is not in the compact format and msgpack is not installed")
+    return [(data.get("temp"), data.get("humidity"), 0, data.get("vibration"), data.get("gas_pressure"))]
+
+
+def _decode_binary(payload):
+    if len(payload) == SINGLE.size:
+        magic, version, count, temp, humidity, age_ms = SINGLE.unpack(payload)
+        if version == BINARY_VERSION and count == 1:
+            return [(None if temp == MISSING else temp / 100,
+                     None if humidity == MISSING else humidity / 10, age_ms, None, None)]
+    magic, version, count = HEADER.unpack_from(payload)
+    if version != BINARY_VERSION:
+        raise ValueError(f"Unsupported binary payload version {version}")
+    if len(payload) != HEADER.size + count * RECORD.size:
+        raise ValueError(f"Binary payload of {len(payload)} bytes for {count} readings")
+    return [
+        (None if temp == MISSING else temp / 100, None if humidity == MISSING else humidity / 10, age_ms,
+         None, None)
+        for temp, humidity, age_ms in RECORD.iter_unpack(memoryview(payload)[HEADER.size:])
+    ]
+
+
+def _fixed(value, scale):
+    return MISSING if value is None else max(MISSING + 1, min(32767, round(value * scale)))
+
+
+def encode_binary(readings):
+    """Encode des (température, humidité, âge_ms) au format binaire compact."""
+    if len(readings) > MAX_RECORDS:
+        raise ValueError(f"At most {MAX_RECORDS} readings per message")
+    out = bytearray(HEADER.size + len(readings) * RECORD.size)
+    HEADER.pack_into(out, 0, BINARY_MAGIC, BINARY_VERSION, len(readings))
+    for i, (temp, humidity, age_ms) in enumerate(readings):
+        RECORD.pack_into(out, HEADER.size + i * RECORD.size, _fixed(temp, 100), _fixed(humidity, 10), age_ms)
+    return bytes(out)
@@ -0,0 +1,164 @@
+"""
+Agrégats par camion et par fenêtre de temps (downsampling en bordure, dans le pont).
+
+Pour chaque camion et chaque fenêtre (1 min et 15 min par défaut), le pont
+tient en mémoire min / max / moyenne de la température et de l'humidité sur
+la fenêtre en cours, alignée sur l'horloge (00:00, 00:01, ...). Quand une
+mesure tombe dans la fenêtre suivante, ou qu'une fenêtre est échue sans
+nouvelle mesure, l'agrégat est écrit dans sa propre mesure
+(`telemetry_1m`, `telemetry_15m`), horodaté au début de la fenêtre, avec le
+nombre de mesures agrégées (`count`). Les vues longues et les rapports
+lisent ces mesures au lieu des points bruts.
+
+Une mesure en retard (boîtier qui renvoie ses mesures après une coupure)
+dont la fenêtre est déjà écrite n'est pas agrégée : rouvrir la fenêtre
+écrirait un agrégat partiel au même horodatage, qui écraserait le complet
+dans InfluxDB. Elle est comptée (`late`) ; le point brut est écrit.
+
+Coût par mesure : O(nombre de fenêtres). Les fenêtres en cours et le
+début de la dernière fenêtre écrite sont sauvegardés à l'arrêt (save) et
+repris au redémarrage (load) : sans cela, le point partiel réécrit après
+redémarrage écraserait le premier.
+"""
+import json
+import math
+import os
+
+from influx_writer import line_protocol
+
+ROLLUP_WINDOWS_S = tuple(int(w) for w in os.getenv("ROLLUP_WINDOWS_S", "60,900").split(","))
+# How often windows that stopped receiving readings are checked for expiry
+ROLLUP_SWEEP_S = float(os.getenv("ROLLUP_SWEEP_S", 5))
+ROLLUP_STATE_FILE = "rollups.json"
+
+
+def window_label(window_s):
+    return f"{window_s // 60}m" if window_s % 60 == 0 else f"{window_s}s"
+
+
+class _Bucket:
+    """Agrégat d'une fenêtre : [n, min, max, somme] par champ."""
+    __slots__ = ("start_s", "stats")
+
+    def __init__(self, start_s, fields):
+        self.start_s = start_s
+        self.stats = {field: [0, math.inf, -math.inf, 0.0] for field in fields}
+
+    def add(self, values):
+        for field, value in values:
+            stat = self.stats[field]
+            stat[0] += 1
+            if value < stat[1]:
+                stat[1] = value
+            if value > stat[2]:
+                stat[2] = value
+            stat[3] += value
+
+    def fields(self):
+        out = {}
+        count = 0
+        for field, (n, low, high, total) in self.stats.items():
+            if n:
+                out[f"{field}_min"] = low
+                out[f"{field}_max"] = high
+                out[f"{field}_mean"] = total / n
+                count = max(count, n)
+        out["count"] = count
+        return out
+
+
+class Rollups:
+    def __init__(self, measurement, fields=("temperature", "humidity"), windows_s=ROLLUP_WINDOWS_S,
+                 sweep_s=ROLLUP_SWEEP_S):
+        self.measurement = measurement
+        self.field_names = tuple(fields)
+        self.windows_s = tuple(windows_s)
+        self.sweep_s = sweep_s
+        # (truck_id, window_s) -> open bucket
+        self._open = {}
+        # (truck_id, window_s) -> start of the last window written
+        self._flushed = {}
+        self._next_sweep_s = 0.0
+        self.written = 0
+        self.late = 0
+
+    def _line(self, truck_id, window_s, bucket):
+        self._flushed[(truck_id, window_s)] = bucket.start_s
+        fields = bucket.fields()
+        if not fields["count"]:
+            return None
+        self.written += 1
+        return line_protocol(f"{self.measurement}_{window_label(window_s)}", {"truck_id": truck_id},
+                             fields, bucket.start_s * 1_000_000_000)
+
+    def add(self, truck_id, values, timestamp_ns):
+        """
+        Ajoute une mesure ; retourne les lignes des agrégats clos (fenêtres
+        de ce camion qui se terminent, puis fenêtres échues des autres).
+        """
+        now_s = timestamp_ns / 1e9
+        lines = []
+        values = [(field, float(value)) for field, value in values.items()
+                  if value is not None and math.isfinite(float(value))]
+        for window_s in self.windows_s:
+            start_s = int(now_s // window_s) * window_s
+            key = (truck_id, window_s)
+            bucket = self._open.get(key)
+            if start_s <= self._flushed.get(key, -math.inf) or (bucket is not None and start_s < bucket.start_s):
+                self.late += 1  # its window is already written, or older than the open one
+                continue
+            if bucket is None or bucket.start_s != start_s:
+                if bucket is not None:
+                    lines.append(self._line(truck_id, window_s, bucket))
+                bucket = self._open[key] = _Bucket(start_s, self.field_names)
+            bucket.add(values)
+        if now_s >= self._next_sweep_s:
+            self._next_sweep_s = now_s + self.sweep_s
+            lines.extend(self.expire(timestamp_ns))
+        return [line for line in lines if line is not None]
+
+    def expire(self, now_ns):
+        """Clôt les fenêtres terminées avant `now_ns` (camions silencieux)."""
+        now_s = now_ns / 1e9
+        expired = [key for key, bucket in self._open.items() if bucket.start_s + key[1] <= now_s]
+        lines = [self._line(truck_id, window_s, self._open.pop((truck_id, window_s)))
+                 for truck_id, window_s in expired]
+        return [line for line in lines if line is not None]
+
+    def save(self, path):
+        """Sauvegarde les fenêtres en cours et les dernières écrites (arrêt propre)."""
+        state = {
+            "open": [
+                {"truck_id": truck_id, "window_s": window_s, "start_s": bucket.start_s,
+                 "stats": {f: [s[0], s[1], s[2], s[3]] for f, s in bucket.stats.items() if s[0]}}
+                for (truck_id, window_s), bucket in self._open.items()
+            ],
+            "flushed": [[truck_id, window_s, start_s] for (truck_id, window_s), start_s in self._flushed.items()],
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+    def load(self, path):
+        """Reprend les fenêtres sauvegardées par save(), s'il y en a."""
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        for truck_id, window_s, start_s in state["flushed"]:
+            if window_s in self.windows_s:
+                self._flushed[(truck_id, window_s)] = start_s
+        for item in state["open"]:
+            if item["window_s"] not in self.windows_s:
+                continue
+            bucket = _Bucket(item["start_s"], self.field_names)
+            for field, stat in item["stats"].items():
+                if field in bucket.stats:
+                    bucket.stats[field] = stat
+            self._open[(item["truck_id"], item["window_s"])] = bucket
+        os.remove(path)
+
+    def stats(self):
+        return {"open_windows": len(self._open), "written": self.written, "late": self.late}
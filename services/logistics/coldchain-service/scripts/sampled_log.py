@@ -0,0 +1,57 @@
+"""
+Journal structuré (une ligne JSON par événement) avec échantillonnage.
+
+Les erreurs par message (charge utile illisible, ...) peuvent arriver des
+milliers de fois par seconde : sampled() n'en écrit qu'au plus
+`LOG_SAMPLE_PER_INTERVAL` par événement et par `LOG_SAMPLE_INTERVAL_S`, et
+la ligne suivante indique combien ont été omises (`suppressed`).
+"""
+import json
+import os
+import sys
+import threading
+import time
+
+LOG_SAMPLE_PER_INTERVAL = int(os.getenv("LOG_SAMPLE_PER_INTERVAL", 5))
+LOG_SAMPLE_INTERVAL_S = float(os.getenv("LOG_SAMPLE_INTERVAL_S", 10))
+
+
+class SampledLog:
+    def __init__(self, component, per_interval=LOG_SAMPLE_PER_INTERVAL, interval_s=LOG_SAMPLE_INTERVAL_S,
+                 stream=None):
+        self.component = component
+        self.per_interval = per_interval
+        self.interval_s = interval_s
+        self.stream = stream
+        self._lock = threading.Lock()
+        # event -> [window start, emitted in window, suppressed since last emit]
+        self._windows = {}
+
+    def _write(self, level, event, fields):
+        record = {"ts": round(time.time(), 3), "level": level, "component": self.component,
+                  "event": event, **fields}
+        stream = self.stream or sys.stdout
+        stream.write(json.dumps(record, default=str) + "\n")
+        stream.flush()
+
+    def info(self, event, **fields):
+        self._write("info", event, fields)
+
+    def error(self, event, **fields):
+        self._write("error", event, fields)
+
+    def sampled(self, level, event, **fields):
+        """Comme info()/error(), mais au plus `per_interval` lignes par intervalle et par événement."""
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(event)
+            if window is None or now - window[0] >= self.interval_s:
+                window = self._windows[event] = [now, 0, window[2] if window else 0]
+            if window[1] >= self.per_interval:
+                window[2] += 1
+                return
+            window[1] += 1
+            suppressed, window[2] = window[2], 0
+        if suppressed:
+            fields["suppressed"] = suppressed
+        self._write(level, event, fields)
@@ -0,0 +1,221 @@
+"""
+Spool disque de la télémétrie pendant les pannes (ou lenteurs) d'InfluxDB.
+
+Les lignes de line protocol non écrites sont ajoutées à des segments en
+append-only (`<n>.seg`, au plus `segment_bytes` chacun) ; un curseur
+(`cursor` : segment + offset, remplacé atomiquement) marque ce qui a déjà
+été rejoué. La relecture se fait par gros blocs, dans l'ordre d'arrivée,
+et les segments entièrement rejoués sont supprimés. Au-delà de `max_bytes`
+sur disque, le segment le plus ancien est abandonné (compté dans
+`dropped_lines`) pour ne jamais remplir le disque du boîtier.
+
+Après un arrêt brutal, une ligne partiellement écrite en fin de segment
+est tronquée à la réouverture.
+"""
+import os
+import threading
+import time
+
+SPOOL_DIR = os.getenv("COLDCHAIN_SPOOL_DIR", "data/spool")
+SPOOL_SEGMENT_BYTES = int(os.getenv("COLDCHAIN_SPOOL_SEGMENT_MB", 16)) * 1024 * 1024
+SPOOL_MAX_BYTES = int(os.getenv("COLDCHAIN_SPOOL_MAX_MB", 2048)) * 1024 * 1024
+SPOOL_FSYNC = os.getenv("COLDCHAIN_SPOOL_FSYNC", "1") == "1"
+
+CURSOR_FILE = "cursor"
+# Bytes read at the cursor to find the oldest pending timestamp
+LAG_PROBE_BYTES = 4096
+
+
+def _timestamp_ns(line):
+    """Horodatage (ns) d'une ligne de line protocol : son dernier champ."""
+    try:
+        return int(line.rsplit(b" ", 1)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+class Spool:
+    def __init__(self, directory=SPOOL_DIR, segment_bytes=SPOOL_SEGMENT_BYTES,
+                 max_bytes=SPOOL_MAX_BYTES, fsync=SPOOL_FSYNC):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._active = None
+        self.appended_lines = 0
+        self.replayed_lines = 0
+        self.dropped_lines = 0
+        os.makedirs(directory, exist_ok=True)
+
+        self._segments = sorted(
+            int(name[:-4]) for name in os.listdir(directory) if name.endswith(".seg")
+        )
+        self._sizes = {seg: self._repair(seg) for seg in self._segments}
+        self._cursor = self._load_cursor()
+        for seg in [s for s in self._segments if s < self._cursor[0]]:
+            self._delete(seg)
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f"{segment:012d}.seg")
+
+    def _repair(self, segment):
+        """Tronque une éventuelle ligne incomplète en fin de segment ; retourne sa taille."""
+        path = self._path(segment)
+        size = os.path.getsize(path)
+        if size == 0:
+            return 0
+        with open(path, "rb+") as f:
+            f.seek(max(0, size - 65536))
+            tail = f.read()
+            if tail.endswith(b"\n"):
+                return size
+            cut = tail.rfind(b"\n")
+            size = size - len(tail) + cut + 1 if cut >= 0 else size - len(tail)
+            f.truncate(size)
+        return size
+
+    def _load_cursor(self):
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILE)) as f:
+                segment, offset = (int(x) for x in f.read().split())
+        except (OSError, ValueError):
+            segment, offset = (self._segments[0] if self._segments else 0), 0
+        return segment, offset
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, CURSOR_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(f"{self._cursor[0]} {self._cursor[1]}")
+        os.replace(tmp, path)
+
+    def _delete(self, segment):
+        if self._active is not None and segment == self._segments[-1]:
+            self._active.close()
+            self._active = None
+        os.remove(self._path(segment))
+        self._segments.remove(segment)
+        del self._sizes[segment]
+
+    @property
+    def disk_bytes(self):
+        return sum(self._sizes.values())
+
+    @property
+    def pending_bytes(self):
+        segment, offset = self._cursor
+        return sum(size for seg, size in self._sizes.items() if seg >= segment) - (
+            offset if segment in self._sizes else 0
+        )
+
+    def __len__(self):
+        """Octets en attente de relecture (0 : spool vide)."""
+        return self.pending_bytes
+
+    def append(self, lines):
+        """Ajoute des lignes (str) en fin de spool, fsync compris si activé."""
+        data = ("\n".join(lines) + "\n").encode()
+        with self._lock:
+            if self._active is None or self._sizes[self._segments[-1]] >= self.segment_bytes:
+                self._roll()
+            self._active.write(data)
+            self._active.flush()
+            if self.fsync:
+                os.fsync(self._active.fileno())
+            self._sizes[self._segments[-1]] += len(data)
+            self.appended_lines += len(lines)
+            while self.disk_bytes > self.max_bytes and len(self._segments) > 1:
+                self._drop_oldest()
+
+    def _roll(self):
+        if self._active is not None:
+            self._active.close()
+        segment = self._segments[-1] + 1 if self._segments else max(self._cursor[0], 1)
+        self._segments.append(segment)
+        self._sizes[segment] = 0
+        self._active = open(self._path(segment), "ab")
+        if len(self._segments) == 1:
+            self._cursor = (segment, 0)
+            self._save_cursor()
+
+    def _drop_oldest(self):
+        oldest = self._segments[0]
+        with open(self._path(oldest), "rb") as f:
+            if oldest == self._cursor[0]:
+                f.seek(self._cursor[1])
+            self.dropped_lines += f.read().count(b"\n")
+        self._delete(oldest)
+        self._cursor = (self._segments[0], 0)
+        self._save_cursor()
+
+    def read(self, max_bytes):
+        """
+        Prochain bloc de lignes complètes à rejouer (au plus ~`max_bytes`)
+        et la position à passer à commit() une fois le bloc écrit.
+        """
+        with self._lock:
+            segment, offset = self._cursor
+            while segment in self._sizes and offset >= self._sizes[segment]:
+                later = [s for s in self._segments if s > segment]
+                if not later:
+                    return [], self._cursor
+                segment, offset = later[0], 0
+            if segment not in self._sizes:
+                return [], self._cursor
+            remaining = self._sizes[segment] - offset
+            with open(self._path(segment), "rb") as f:
+                f.seek(offset)
+                data = f.read(min(max_bytes, remaining))
+        end = data.rfind(b"\n") + 1
+        if end == 0:
+            if len(data) < remaining:
+                # A single line longer than max_bytes: read it whole
+                return self.read(max_bytes * 2)
+            end = len(data)
+        # Not splitlines(): tag values may hold \x1c, \x85, \u2028...
+        lines = data[:end].decode().removesuffix("\n").split("\n")
+        return lines, (segment, offset + end)
+
+    def commit(self, position, count):
+        """Valide la relecture jusqu'à `position` et supprime les segments épuisés."""
+        with self._lock:
+            self._cursor = position
+            self.replayed_lines += count
+            for seg in [s for s in self._segments if s < position[0]]:
+                self._delete(seg)
+            segment, offset = position
+            if self._segments and segment == self._segments[-1] and offset >= self._sizes[segment]:
+                # Fully replayed: start over with a fresh segment
+                self._delete(segment)
+                self._cursor = (segment + 1, 0)
+            self._save_cursor()
+
+    def lag_s(self):
+        """Âge (s) de la plus ancienne ligne en attente de relecture."""
+        with self._lock:
+            segment, offset = self._cursor
+            if self.pending_bytes == 0 or segment not in self._sizes:
+                return 0.0
+            with open(self._path(segment), "rb") as f:
+                f.seek(offset)
+                head = f.read(LAG_PROBE_BYTES).split(b"\n", 1)[0]
+        timestamp = _timestamp_ns(head)
+        return round(time.time() - timestamp / 1e9, 1) if timestamp else None
+
+    def close(self):
+        with self._lock:
+            if self._active is not None:
+                self._active.close()
+                self._active = None
+
+    def stats(self):
+        return {
+            "pending_bytes": self.pending_bytes,
+            "disk_bytes": self.disk_bytes,
+            "segments": len(self._segments),
+            "appended_lines": self.appended_lines,
+            "replayed_lines": self.replayed_lines,
+            "dropped_lines": self.dropped_lines,
+            "replay_lag_s": self.lag_s(),
+        }
@@ -0,0 +1,77 @@
+"""
+Benchmark : certificat PDF d'un trajet complet (100 000 mesures par défaut).
+
+Les mesures d'un trajet simulé (une toutes les `--interval-s` secondes,
+avec quelques ouvertures de porte qui font des excursions) sont produites
+par un générateur, comme un curseur de requête Influx. Mesure le temps de
+rendu, le nombre de pages, la taille du fichier, puis, dans une seconde
+passe sous tracemalloc, la mémoire Python maximale : avec un itérateur,
+puis avec la liste de dicts que demandait l'ancienne version.
+
+Usage (depuis la racine du dépôt) :
+    python services/logistics/coldchain-service/services/bench_report_generator.py --points 100000
+"""
+import argparse
+import datetime
+import math
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from report_generator import ColdChainReport
+
+
+def trip(points, interval_s, seed=0):
+    rng = random.Random(seed)
+    start = datetime.datetime(2026, 10, 1, tzinfo=datetime.timezone.utc)
+    heat = 0.0
+    for i in range(points):
+        if rng.random() < 0.0005:
+            heat = 5.0  # door opening
+        heat *= 0.97
+        temp = 3.5 + 0.5 * math.sin(i / 360) + heat + rng.gauss(0, 0.1)
+        yield {"time": start + datetime.timedelta(seconds=i * interval_s), "temp": round(temp, 2),
+               "humidity": round(85 + rng.gauss(0, 1), 1)}
+
+
+def render(points, path):
+    report = ColdChainReport("TRK-BENCH", points)
+    report.file_path = path
+    report.generate()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--points", type=int, default=100_000)
+    parser.add_argument("--interval-s", type=float, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "report.pdf")
+        start = time.perf_counter()
+        report = render(trip(args.points, args.interval_s), path)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(path)
+
+        tracemalloc.start()
+        render(trip(args.points, args.interval_s), path)
+        streaming_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        render(list(trip(args.points, args.interval_s)), path)
+        list_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    summary = report.summary
+    print(f"points: {summary.count}, pages: {report.pages}, file: {size / 1e6:.1f} MB")
+    print(f"render: {elapsed:.2f} s ({summary.count / elapsed:.0f} points/s, "
+          f"{elapsed / report.pages * 1000:.1f} ms/page)")
+    print(f"summary: avg {summary.avg_temp:.2f} C, min {summary.temp_min:.2f}, max {summary.temp_max:.2f}, "
+          f"{summary.excursions} excursions ({summary.excursion_s / 60:.0f} min)")
+    print(f"peak Python memory: iterator {streaming_peak / 1e6:.1f} MB, list {list_peak / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
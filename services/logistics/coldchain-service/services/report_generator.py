@@ -1,75 +1,294 @@
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
+"""
+Certificat PDF chaîne du froid d'un trajet.
+
+Les mesures (dicts {'time', 'temp', 'humidity'}) sont lues une seule fois,
+depuis une liste ou n'importe quel itérateur (curseur de requête Influx,
+voir flux_points) : le tableau s'étend sur autant de pages que nécessaire
+et les statistiques du résumé sont calculées au passage (TripSummary).
+Aucune mesure n'est gardée : seule la page en cours est tamponnée, et
+chaque page terminée est écrite sur disque (StreamingCanvas,
+streaming_pdf.py ; reportlab garderait toutes les pages jusqu'à save()).
+
+Le statut de conformité et le nombre total de pages ne sont connus qu'à
+la fin : les pages y font référence par des formulaires PDF
+(beginForm/doForm) définis après la dernière mesure.
+"""
+import datetime
+import math
+import os
+import sys
+
 from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
-import datetime
+
+try:
+    from streaming_pdf import StreamingCanvas
+except ImportError:  # imported as services.report_generator
+    from .streaming_pdf import StreamingCanvas
+
+# The excursion logic is shared with the MQTT bridge
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+if SCRIPTS_DIR not in sys.path:
+    sys.path.insert(0, SCRIPTS_DIR)
+from excursions import ExcursionDetector  # noqa: E402
+
+ROW_HEIGHT = 0.6 * cm
+COLUMNS_X = (2 * cm, 10 * cm, 15 * cm)
+TABLE_BOTTOM = 2 * cm
+# Height of the summary box and its margin above the page bottom
+SUMMARY_TOP = 5.5 * cm
+
+
+def flux_points(records):
+    """
+    Adapte les FluxRecord d'une requête pivotée (query_stream, colonnes
+    temperature et humidity) au format attendu par ColdChainReport.
+    """
+    for record in records:
+        yield {"time": record.get_time(), "temp": record.values.get("temperature"),
+               "humidity": record.values.get("humidity")}
+
+
+def _timestamp_ns(value):
+    """Horodatage en ns d'un datetime, d'un epoch en secondes ou d'une date ISO 8601 ; None sinon."""
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return int(value.timestamp() * 1e9)
+    if isinstance(value, (int, float)):
+        return int(value * 1e9)
+    if isinstance(value, str):
+        try:
+            return _timestamp_ns(datetime.datetime.fromisoformat(value.replace("Z", "+00:00")))
+        except ValueError:
+            return None
+    return None
+
+
+def _format_time(value):
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%d/%m/%Y %H:%M:%S")
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value, datetime.timezone.utc).strftime("%d/%m/%Y %H:%M:%S")
+    return str(value)
+
+
+def _format_value(value, unit, digits):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.{digits}f}{unit}"
+    return f"{value}{unit}"
+
+
+class TripSummary:
+    """Statistiques du trajet, mises à jour mesure par mesure en O(1)."""
+
+    def __init__(self, truck_id, detector=None):
+        self.truck_id = truck_id
+        self.detector = detector or ExcursionDetector()
+        self.count = 0
+        self.temp_count = 0
+        self.temp_min = math.inf
+        self.temp_max = -math.inf
+        self.temp_sum = 0.0
+        self.first_time = None
+        self.last_time = None
+        self.last_ns = None
+        self.excursions = 0
+        self.excursion_s = 0.0
+        self._open_since_ns = None
+        # Excursion times are unknown when a point has no usable timestamp
+        self.timed = True
+
+    def add(self, point):
+        self.count += 1
+        if self.first_time is None:
+            self.first_time = point["time"]
+        self.last_time = point["time"]
+        temp = point.get("temp")
+        if temp is None or not math.isfinite(float(temp)):
+            return
+        temp = float(temp)
+        self.temp_count += 1
+        self.temp_sum += temp
+        self.temp_min = min(self.temp_min, temp)
+        self.temp_max = max(self.temp_max, temp)
+
+        timestamp_ns = _timestamp_ns(point["time"])
+        if timestamp_ns is None:
+            self.timed = False
+            timestamp_ns = self.last_ns or 0
+        self.last_ns = timestamp_ns
+        event = self.detector.update(self.truck_id, temp, timestamp_ns)
+        if event is not None:
+            if event["event"] == "start":
+                self.excursions += 1
+                self._open_since_ns = event["started_ns"]
+            else:
+                self.excursion_s += event["duration_s"]
+                self._open_since_ns = None
+
+    def finish(self):
+        """Compte jusqu'à la dernière mesure une excursion encore en cours."""
+        if self._open_since_ns is not None:
+            self.excursion_s += (self.last_ns - self._open_since_ns) / 1e9
+            self._open_since_ns = None
+
+    @property
+    def avg_temp(self):
+        return self.temp_sum / self.temp_count if self.temp_count else None
+
+    @property
+    def compliant(self):
+        return self.excursions == 0
+
 
 class ColdChainReport:
     def __init__(self, truck_id, data_points):
         self.truck_id = truck_id
-        self.data_points = data_points # Liste de dict: {'time': ..., 'temp': ...}
+        # Liste ou itérateur de dicts {'time': ..., 'temp': ..., 'humidity': ...}, lu une seule fois
+        self.data_points = data_points
         self.file_path = f"services/logistics/coldchain-service/reports/report_{truck_id}_{datetime.date.today()}.pdf"
+        self.pages = 0
+        self.summary = None
 
-    def generate(self):
-        import os
-        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
-        
-        c = canvas.Canvas(self.file_path, pagesize=A4)
-        width, height = A4
+    def _page_header(self, c, width, height, first, table=True):
+        c.setFillColorRGB(0.05, 0.2, 0.4)  # AgriLogistic Blue
+        if first:
+            # Header - Brand Aesthetic
+            c.rect(0, height - 3*cm, width, 3*cm, fill=1)
+            c.setFillColor(colors.white)
+            c.setFont("Helvetica-Bold", 18)
+            c.drawString(1.5*cm, height - 1.8*cm, "AGRILOGISTIC - CERTIFICAT CHAÎNE DU FROID")
 
-        # Header - Brand Aesthetic
-        c.setFillColorRGB(0.05, 0.2, 0.4) # AgriLogistic Blue
-        c.rect(0, height - 3*cm, width, 3*cm, fill=1)
-        
-        c.setFillColor(colors.white)
-        c.setFont("Helvetica-Bold", 18)
-        c.drawString(1.5*cm, height - 1.8*cm, "AGRILOGISTIC - CERTIFICAT CHAÎNE DU FROID")
-        
-        # Info Block
-        c.setFillColor(colors.black)
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(1.5*cm, height - 4.5*cm, f"ID Camion : {self.truck_id}")
-        c.drawString(1.5*cm, height - 5.2*cm, f"Date du Rapport : {datetime.datetime.now().strftime('%d/%m/%Y %H:%M')}")
-        c.drawString(width - 7*cm, height - 4.5*cm, f"Statut : CONFORME ✅")
+            # Info Block
+            c.setFillColor(colors.black)
+            c.setFont("Helvetica-Bold", 12)
+            c.drawString(1.5*cm, height - 4.5*cm, f"ID Camion : {self.truck_id}")
+            c.drawString(1.5*cm, height - 5.2*cm, f"Date du Rapport : {datetime.datetime.now().strftime('%d/%m/%Y %H:%M')}")
+            c.drawString(width - 7*cm, height - 4.5*cm, "Statut : ")
+            c.doForm("status")
 
-        # Visual Divider
-        c.setStrokeColor(colors.lightgrey)
-        c.line(1.5*cm, height - 6*cm, width - 1.5*cm, height - 6*cm)
+            # Visual Divider
+            c.setStrokeColor(colors.lightgrey)
+            c.line(1.5*cm, height - 6*cm, width - 1.5*cm, height - 6*cm)
+            table_top = height - 7*cm
+        else:
+            c.rect(0, height - 1.5*cm, width, 1.5*cm, fill=1)
+            c.setFillColor(colors.white)
+            c.setFont("Helvetica-Bold", 11)
+            c.drawString(1.5*cm, height - 1*cm, f"CERTIFICAT CHAÎNE DU FROID - {self.truck_id} (suite)")
+            c.setFillColor(colors.black)
+            table_top = height - 2.5*cm
+        if not table:
+            return None
 
         # Main Table Header
         c.setFont("Helvetica-Bold", 10)
-        c.drawString(2*cm, height - 7*cm, "Timestamp")
-        c.drawString(10*cm, height - 7*cm, "Température (°C)")
-        c.drawString(15*cm, height - 7*cm, "Humidité (%)")
+        c.drawString(COLUMNS_X[0], table_top, "Timestamp")
+        c.drawString(COLUMNS_X[1], table_top, "Température (°C)")
+        c.drawString(COLUMNS_X[2], table_top, "Humidité (%)")
+        c.setFont("Helvetica", 10)
+        return table_top - 1*cm
 
-        # Table Content
-        y = height - 8*cm
+    def _draw_rows(self, c, top, rows):
+        """Une colonne du tableau = un seul objet texte (drawString par cellule : ~1,5x plus lent)."""
         c.setFont("Helvetica", 10)
-        avg_temp = sum(d['temp'] for d in self.data_points) / len(self.data_points)
-        
-        for point in self.data_points[:20]: # Show first 20 records
-            c.drawString(2*cm, y, point['time'])
-            c.drawString(10*cm, y, f"{point['temp']}°C")
-            c.drawString(15*cm, y, f"{point['humidity']}%")
-            y -= 0.6*cm
+        for x, lines in zip(COLUMNS_X, rows):
+            c.drawLines(x, top, lines, ROW_HEIGHT)
+            lines.clear()
+
+    def _page_footer(self, c):
+        self.pages += 1
+        label = f"Page {self.pages} / "
+        c.setFont("Helvetica", 8)
+        c.drawString(1.5*cm, 1*cm, label)
+        # The total is only known at the end: a form drawn at its origin
+        c.saveState()
+        c.translate(1.5*cm + c.stringWidth(label, "Helvetica", 8), 1*cm)
+        c.doForm("page_count")
+        c.restoreState()
 
+    def _define_forms(self, c, width, height):
+        summary = self.summary
+        c.beginForm("status")
+        c.setFont("Helvetica-Bold", 12)
+        if summary.compliant:
+            c.setFillColor(colors.black)
+            c.drawString(width - 5.2*cm, height - 4.5*cm, "CONFORME ✅")
+        else:
+            c.setFillColor(colors.red)
+            c.drawString(width - 5.2*cm, height - 4.5*cm, "NON CONFORME")
+        c.endForm()
+
+        c.beginForm("page_count")
+        c.setFont("Helvetica", 8)
+        c.drawString(0, 0, str(self.pages))
+        c.endForm()
+
+    def _draw_summary(self, c, width):
+        summary = self.summary
         # Final Analytics
         c.setFillColorRGB(0.95, 0.95, 0.95)
         c.rect(1.5*cm, 2*cm, width - 3*cm, 3*cm, fill=1)
-        
+
         c.setFillColor(colors.black)
         c.setFont("Helvetica-Bold", 12)
         c.drawString(2.5*cm, 4*cm, "RÉSUMÉ ANALYTIQUE")
         c.setFont("Helvetica", 10)
-        c.drawString(2.5*cm, 3.2*cm, f"Température Moyenne : {avg_temp:.22f}°C")
-        c.drawString(2.5*cm, 2.7*cm, "Excursions thermiques : 0 (0 min)")
-        
+        if summary.avg_temp is None:
+            c.drawString(2.5*cm, 3.2*cm, "Aucune mesure de température")
+        else:
+            c.drawString(2.5*cm, 3.2*cm, f"Température Moyenne : {summary.avg_temp:.2f}°C "
+                                         f"(min {summary.temp_min:.1f}°C, max {summary.temp_max:.1f}°C, "
+                                         f"{summary.count} mesures)")
+        duration = f"{summary.excursion_s / 60:.0f} min" if summary.timed else "durée inconnue"
+        c.drawString(2.5*cm, 2.7*cm, f"Excursions thermiques : {summary.excursions} ({duration})")
+        c.drawString(2.5*cm, 2.2*cm, f"Période : {_format_time(summary.first_time)} - {_format_time(summary.last_time)}"
+                     if summary.count else "Période : -")
+
         # Security Signature
         c.setFont("Helvetica-Oblique", 8)
         c.drawString(width - 8*cm, 1*cm, f"Signature Numérique : SHA256_{self.truck_id}_SECURE")
 
+    def generate(self):
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+
+        c = StreamingCanvas(self.file_path, pagesize=A4)
+        width, height = A4
+        self.pages = 0
+        self.summary = summary = TripSummary(self.truck_id)
+
+        # Table Content: one page of rows at a time
+        top = y = self._page_header(c, width, height, first=True)
+        rows = ([], [], [])
+        for point in self.data_points:
+            if y < TABLE_BOTTOM:
+                self._draw_rows(c, top, rows)
+                self._page_footer(c)
+                c.showPage()
+                top = y = self._page_header(c, width, height, first=False)
+            summary.add(point)
+            rows[0].append(_format_time(point["time"]))
+            rows[1].append(_format_value(point.get("temp"), "°C", 1))
+            rows[2].append(_format_value(point.get("humidity"), "%", 0))
+            y -= ROW_HEIGHT
+        self._draw_rows(c, top, rows)
+        summary.finish()
+
+        if y < SUMMARY_TOP:
+            self._page_footer(c)
+            c.showPage()
+            self._page_header(c, width, height, first=False, table=False)
+        self._draw_summary(c, width)
+        self._page_footer(c)
+        c.showPage()
+        self._define_forms(c, width, height)
+
         c.save()
-        print(f"✅ Rapport PDF généré : {self.file_path}")
+        print(f"✅ Rapport PDF généré : {self.file_path} ({self.pages} pages, {summary.count} mesures)")
         return self.file_path
 
 if __name__ == "__main__":
@@ -0,0 +1,181 @@
+"""
+Écriture d'un PDF page par page, à mémoire constante.
+
+reportlab (canvas.Canvas) garde le contenu de toutes les pages jusqu'à
+save() : la mémoire croît avec la longueur du trajet. StreamingCanvas
+reprend le sous-ensemble de l'API Canvas utilisé par report_generator.py
+et écrit chaque page (flux compressé + objet /Page) dès showPage(). Seuls
+les offsets des objets (8 octets chacun, deux objets par page) restent en
+mémoire pour la table xref finale.
+
+Les objets qui dépendent de la fin du document (arbre des pages, polices,
+ressources, formulaires beginForm/doForm) sont référencés par numéro
+réservé à l'avance et écrits par save().
+
+Limites : polices Type 1 standard en WinAnsiEncoding (les caractères hors
+cp1252 sont omis), couleurs RGB, pas d'images.
+"""
+import zlib
+from array import array
+
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+CATALOG, PAGES, RESOURCES = 1, 2, 3
+
+
+def _num(value):
+    """Nombre PDF compact : 2 décimales au plus, sans zéros inutiles."""
+    text = f"{value:.2f}".rstrip("0").rstrip(".")
+    return "0" if text == "-0" else text
+
+
+def _string(text):
+    """Chaîne littérale PDF (WinAnsi) : parenthèses, antislash et retours échappés."""
+    data = text.encode("cp1252", "ignore")
+    data = data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)").replace(b"\r", b"\\r")
+    return b"(" + data + b")"
+
+
+class StreamingCanvas:
+    def __init__(self, path, pagesize, compression=True):
+        self.pagesize = pagesize
+        self.compression = compression
+        self._file = open(path, "wb")
+        self._position = 0
+        # Byte offset of each object; 0 until written (objects 1-3 are reserved)
+        self._offsets = array("Q", [0, 0, 0])
+        self._pages = array("Q")
+        self._fonts = {}  # base font name -> (resource name, object number)
+        self._forms = {}  # form name -> object number
+        self._defined = set()
+        self._font = ("Helvetica", 12)
+        self._code = []
+        self._form_code = None
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _write(self, data):
+        self._file.write(data)
+        self._position += len(data)
+
+    def _reserve(self):
+        self._offsets.append(0)
+        return len(self._offsets)
+
+    def _object(self, number, body, stream=None):
+        self._offsets[number - 1] = self._position
+        self._write(f"{number} 0 obj\n".encode())
+        if stream is None:
+            self._write(body.encode() + b"\nendobj\n")
+            return
+        if self.compression:
+            stream = zlib.compress(stream)
+            body += " /Filter /FlateDecode"
+        self._write(f"<< {body} /Length {len(stream)} >>\nstream\n".encode())
+        self._write(stream + b"\nendstream\nendobj\n")
+
+    # Graphics state and drawing (same signatures as reportlab's Canvas)
+
+    def setFont(self, name, size, leading=None):
+        self._font = (name, size)
+        if name not in self._fonts:
+            self._fonts[name] = (f"F{len(self._fonts) + 1}", self._reserve())
+
+    def setFillColorRGB(self, r, g, b):
+        self._code.append(f"{_num(r)} {_num(g)} {_num(b)} rg")
+
+    def setFillColor(self, color):
+        self.setFillColorRGB(*color.rgb())
+
+    def setStrokeColor(self, color):
+        r, g, b = color.rgb()
+        self._code.append(f"{_num(r)} {_num(g)} {_num(b)} RG")
+
+    def saveState(self):
+        self._code.append("q")
+
+    def restoreState(self):
+        self._code.append("Q")
+
+    def translate(self, dx, dy):
+        self._code.append(f"1 0 0 1 {_num(dx)} {_num(dy)} cm")
+
+    def rect(self, x, y, width, height, stroke=1, fill=0):
+        operator = {(1, 1): "B", (0, 1): "f", (1, 0): "S"}.get((int(bool(stroke)), int(bool(fill))), "n")
+        self._code.append(f"{_num(x)} {_num(y)} {_num(width)} {_num(height)} re {operator}")
+
+    def line(self, x1, y1, x2, y2):
+        self._code.append(f"{_num(x1)} {_num(y1)} m {_num(x2)} {_num(y2)} l S")
+
+    def stringWidth(self, text, font_name=None, font_size=None):
+        return stringWidth(text, font_name or self._font[0], font_size or self._font[1])
+
+    def _text(self, x, y, lines, leading):
+        self.setFont(*self._font)
+        name, size = self._font
+        ops = [f"BT /{self._fonts[name][0]} {_num(size)} Tf {_num(leading)} TL 1 0 0 1 {_num(x)} {_num(y)} Tm"]
+        ops.extend(_string(line).decode("latin-1") + " Tj T*" for line in lines)
+        ops.append("ET")
+        self._code.append("\n".join(ops))
+
+    def drawString(self, x, y, text):
+        self._text(x, y, [text], 0)
+
+    def drawLines(self, x, y, lines, leading):
+        """Une ligne de texte par élément, `leading` points plus bas à chaque fois (un seul objet texte)."""
+        self._text(x, y, lines, leading)
+
+    # Pages and forms
+
+    def showPage(self):
+        content, page = self._reserve(), self._reserve()
+        self._object(content, "", "\n".join(self._code).encode("latin-1"))
+        width, height = self.pagesize
+        self._object(page, f"<< /Type /Page /Parent {PAGES} 0 R /MediaBox [0 0 {_num(width)} {_num(height)}] "
+                           f"/Contents {content} 0 R /Resources {RESOURCES} 0 R >>")
+        self._pages.append(page)
+        self._code = []
+
+    def doForm(self, name):
+        if name not in self._forms:
+            self._forms[name] = self._reserve()
+        self._code.append(f"/{name} Do")
+
+    def beginForm(self, name):
+        """Les dessins jusqu'à endForm() forment `name`, déjà utilisable avant (doForm) comme après."""
+        if name not in self._forms:
+            self._forms[name] = self._reserve()
+        self._form_code, self._code = self._code, []
+        self._form_name = name
+
+    def endForm(self):
+        name, code = self._form_name, self._code
+        self._code, self._form_code = self._form_code, None
+        width, height = self.pagesize
+        self._object(self._forms[name], f"/Type /XObject /Subtype /Form /BBox [0 0 {_num(width)} {_num(height)}] "
+                                        f"/Resources {RESOURCES} 0 R", "\n".join(code).encode("latin-1"))
+        self._defined.add(name)
+
+    def save(self):
+        """Écrit les objets différés, la table xref et ferme le fichier."""
+        missing = set(self._forms) - self._defined
+        if missing:
+            raise ValueError(f"Forms used but never defined: {sorted(missing)}")
+        if self._code:
+            self.showPage()
+        for base_font, (_, number) in self._fonts.items():
+            self._object(number, f"<< /Type /Font /Subtype /Type1 /BaseFont /{base_font} "
+                                 f"/Encoding /WinAnsiEncoding >>")
+        fonts = " ".join(f"/{name} {number} 0 R" for name, number in self._fonts.values())
+        forms = " ".join(f"/{name} {number} 0 R" for name, number in self._forms.items())
+        self._object(RESOURCES, f"<< /ProcSet [/PDF /Text] /Font << {fonts} >> /XObject << {forms} >> >>")
+        kids = " ".join(f"{page} 0 R" for page in self._pages)
+        self._object(PAGES, f"<< /Type /Pages /Count {len(self._pages)} /Kids [{kids}] >>")
+        self._object(CATALOG, f"<< /Type /Catalog /Pages {PAGES} 0 R >>")
+
+        xref = self._position
+        self._write(f"xref\n0 {len(self._offsets) + 1}\n0000000000 65535 f \n".encode())
+        for start in range(0, len(self._offsets), 4096):
+            self._write("".join(f"{offset:010d} 00000 n \n" for offset in self._offsets[start:start + 4096]).encode())
+        self._write(f"trailer\n<< /Size {len(self._offsets) + 1} /Root {CATALOG} 0 R >>\n"
+                    f"startxref\n{xref}\n%%EOF\n".encode())
+        self._file.close()
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# scripts/ and ml/ use flat imports, as when run from their own directory
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for name in ("scripts", "ml"):
+    path = os.path.join(SERVICE_DIR, name)
+    if path not in sys.path:
+        sys.path.insert(0, path)
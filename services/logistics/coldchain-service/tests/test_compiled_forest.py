@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from compiled_forest import CompiledForest, export_forest
+from failure_predictor import FEATURES, FailurePredictor
+
+
+@pytest.fixture(scope="module")
+def model():
+    df = FailurePredictor().generate_synthetic_data(2000)
+    forest = RandomForestClassifier(n_estimators=30, random_state=0)
+    return forest.fit(df[FEATURES].to_numpy(), df["target"])
+
+
+def fleet(n, seed):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.normal(4, 3, n), rng.normal(0.5, 0.3, n), rng.normal(150, 30, n), rng.uniform(0, 120, n),
+    ])
+
+
+@pytest.mark.parametrize("n", [1, 7, 500, 5000])
+def test_matches_sklearn(model, n):
+    X = fleet(n, seed=n)
+    compiled = export_forest(model)
+    np.testing.assert_array_equal(compiled.predict_proba(X), model.predict_proba(X)[:, 1])
+
+
+def test_matches_sklearn_on_split_thresholds(model):
+    # Values exactly on a split go left in both implementations
+    tree = model.estimators_[0].tree_
+    internal = np.flatnonzero(tree.children_left != -1)
+    X = np.tile(fleet(1, seed=0), (len(internal), 1))
+    X[np.arange(len(internal)), tree.feature[internal]] = tree.threshold[internal]
+    X = X.astype(np.float32).astype(np.float64)  # sklearn compares in float32 too
+    np.testing.assert_array_equal(export_forest(model).predict_proba(X), model.predict_proba(X)[:, 1])
+
+
+def test_save_load_roundtrip(model, tmp_path):
+    X = fleet(200, seed=1)
+    path = tmp_path / "forest.npz"
+    export_forest(model).save(path)
+    np.testing.assert_array_equal(CompiledForest.load(path).predict_proba(X), model.predict_proba(X)[:, 1])
@@ -0,0 +1,46 @@
+import json
+from types import SimpleNamespace
+
+from excursions import ExcursionDetector
+from mqtt_to_influx import BridgeState, on_message
+from payloads import encode_binary
+
+
+class ListWriter:
+    def __init__(self):
+        self.lines = []
+
+    def add(self, line, urgent=False):
+        self.lines.append(line)
+
+    def close(self):
+        pass
+
+
+def test_late_reading_is_ignored():
+    detector = ExcursionDetector(high_c=6.0, hysteresis_c=0.5)
+    assert detector.update("T1", 8.0, 10_000_000_000)["event"] == "start"
+    assert detector.update("T1", 4.0, 5_000_000_000) is None  # older than the start
+    event = detector.update("T1", 4.0, 12_000_000_000)
+    assert event["event"] == "end" and event["duration_s"] == 2.0
+    assert detector.stats()["late"] == 1
+
+
+def test_late_reading_does_not_open_an_excursion():
+    detector = ExcursionDetector(high_c=6.0)
+    assert detector.update("T1", 4.0, 10_000_000_000) is None
+    assert detector.update("T1", 9.0, 9_000_000_000) is None
+    assert detector.open_excursions() == []
+
+
+def test_aged_binary_reading_after_live_reading():
+    state = BridgeState(ListWriter(), detector=ExcursionDetector(high_c=6.0, hysteresis_c=0.5))
+    on_message(None, state, SimpleNamespace(topic="truck/T1/telemetry",
+                                            payload=json.dumps({"temp": 9.0, "humidity": 80}).encode()))
+    on_message(None, state, SimpleNamespace(topic="truck/T1/telemetry",
+                                            payload=encode_binary([(4.0, 80, 5000)])))
+    events = [line for line in state.writer.lines if line.startswith("excursion,")]
+    assert len(events) == 1 and "event=start" in events[0]
+    assert state.detector.stats() == {"trucks": 1, "started": 1, "ended": 0, "open": 1, "late": 1}
+    # The aged reading itself is still written
+    assert sum(line.startswith("telemetry,") for line in state.writer.lines) == 2
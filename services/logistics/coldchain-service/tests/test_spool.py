@@ -0,0 +1,94 @@
+import time
+
+import influx_writer
+from influx_writer import BatchWriter
+from spool import Spool
+
+
+class Rejected(Exception):
+    status = 400
+
+
+def telemetry(n):
+    return [f"telemetry,truck_id=T{i % 7} temperature={i % 11}.5 {1_700_000_000_000_000_000 + i}" for i in range(n)]
+
+
+def replay_all(spool, max_bytes):
+    out = []
+    while True:
+        lines, position = spool.read(max_bytes)
+        if not lines:
+            return out
+        out.extend(lines)
+        spool.commit(position, len(lines))
+
+
+def test_replay_keeps_order_across_segments_and_restarts(tmp_path):
+    lines = telemetry(3000)
+    spool = Spool(str(tmp_path), segment_bytes=4096, fsync=False)
+    for start in range(0, 2000, 250):
+        spool.append(lines[start:start + 250])
+    replayed = []
+    for _ in range(5):
+        chunk, position = spool.read(3000)
+        replayed.extend(chunk)
+        spool.commit(position, len(chunk))
+    spool.close()
+
+    # Restart mid-replay, then more data arrives behind the backlog
+    spool = Spool(str(tmp_path), segment_bytes=4096, fsync=False)
+    spool.append(lines[2000:])
+    replayed.extend(replay_all(spool, 5000))
+    assert replayed == lines
+    assert len(spool) == 0
+
+
+def test_partial_replay_resumes_at_first_pending_line(tmp_path):
+    lines = telemetry(64)
+    lines[5] = lines[5].replace("telemetry", "bad")
+    lines[40] = lines[40].replace("telemetry", "bad")
+    written = []
+    calls = 0
+
+    def sink(batch):
+        nonlocal calls
+        calls += 1
+        if calls == 6:  # after lines[:4] are written
+            raise ConnectionError("database down")
+        if any(line.startswith("bad") for line in batch):
+            raise Rejected("unable to parse")
+        written.extend(batch)
+
+    spool = Spool(str(tmp_path), fsync=False)
+    spool.append(lines)
+    writer = BatchWriter(sink, spool=spool)
+    while len(spool):
+        writer._replay()
+    assert written == [line for line in lines if not line.startswith("bad")]
+    assert (tmp_path / influx_writer.DEAD_LETTER_FILE).read_text().splitlines() == [lines[5], lines[40]]
+    assert writer.rejected == 2
+
+
+def test_writer_spools_during_outage_and_replays_in_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(influx_writer, "RETRY_BACKOFF_S", (0.01,))
+    lines = telemetry(5000)
+    written = []
+    down_until = time.monotonic() + 0.3
+
+    def sink(batch):
+        if time.monotonic() < down_until:
+            raise ConnectionError("database down")
+        written.extend(batch)
+
+    writer = BatchWriter(sink, batch_size=100, flush_interval_s=0.01,
+                         spool=Spool(str(tmp_path), segment_bytes=8192, fsync=False)).start()
+    for i, line in enumerate(lines):
+        writer.add(line)
+        if i % 500 == 0:
+            time.sleep(0.05)
+    deadline = time.monotonic() + 10
+    while len(written) < len(lines) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.close()
+    assert writer.errors > 0
+    assert written == lines
@@ -0,0 +1,20 @@
+import json
+import time
+
+from sklearn.ensemble import RandomForestClassifier
+
+from compiled_forest import export_forest
+from failure_predictor import FEATURES, FailurePredictor
+from train_pipeline import model_version, save_artifact
+
+
+def test_runs_started_in_the_same_second_keep_both_artifacts(tmp_path):
+    df = FailurePredictor().generate_synthetic_data(2000)
+    model = RandomForestClassifier(n_estimators=2, random_state=0).fit(df[FEATURES].to_numpy(), df["target"])
+    started = time.time()
+    paths = [save_artifact(model, export_forest(model), {"version": model_version(started)}, str(tmp_path))
+             for _ in range(2)]
+    assert paths[0] != paths[1]
+    for path in paths:
+        with open(f"{path}/metadata.json") as f:
+            assert json.load(f)["version"] == path.rsplit("/", 1)[1]
@@ -0,0 +1,59 @@
+"""
+Benchmark : débit du SolverPool (problèmes/minute) selon le nombre de workers.
+
+Usage (depuis services/logistics/vrp-engine) :
+    python benchmarks/bench_batch.py --problems 32 --stops 80 --workers 1 2 4 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_decomposition import make_request  # noqa: E402
+from jobs import SolverPool  # noqa: E402
+from solver import solve  # noqa: E402
+
+
+async def run_batch(workers, requests):
+    pool = SolverPool(workers=workers, max_queue=len(requests))
+    pool.start()
+    try:
+        # Let the spawned workers finish warming up before timing
+        await asyncio.sleep(3)
+        start = time.perf_counter()
+        results = await pool.map(solve, requests)
+        return time.perf_counter() - start, results
+    finally:
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--problems", type=int, default=32)
+    parser.add_argument("--stops", type=int, default=80)
+    parser.add_argument("--latency-ms", type=int, default=1000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count()])
+    args = parser.parse_args()
+
+    requests = [
+        make_request(args.stops, num_vehicles=4, seed=seed).model_copy(
+            update={"max_latency_ms": args.latency_ms}
+        )
+        for seed in range(args.problems)
+    ]
+
+    print(f"{'workers':>7} | {'wall (s)':>8} | {'problems/min':>12} | {'speedup':>7}")
+    print("-" * 45)
+    baseline = None
+    for workers in args.workers:
+        wall, results = asyncio.run(run_batch(workers, requests))
+        throughput = len(results) / wall * 60
+        baseline = baseline or throughput
+        print(f"{workers:>7} | {wall:>8.1f} | {throughput:>12.1f} | {throughput / baseline:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark : résolution monolithique vs décomposition cluster-first.
+
+Compare le temps total (wall clock) et la distance totale obtenue pour des
+instances aléatoires de taille croissante. Les sous-problèmes sont résolus
+en parallèle sur tous les cœurs, comme dans le SolverPool.
+
+Usage (depuis services/logistics/vrp-engine) :
+    python benchmarks/bench_decomposition.py --sizes 500 1000 2000 --vehicles 40
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from decompose import partition, stitch  # noqa: E402
+from models import VRPRequest  # noqa: E402
+from solver import solve  # noqa: E402
+
+
+def make_request(n, num_vehicles, seed=7):
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(6.8, 8.6, n)
+    lngs = rng.uniform(-6.0, -4.2, n)
+    lats[0], lngs[0] = 7.69, -5.03  # depot near Bouaké
+    demands = rng.integers(1, 8, n)
+    demands[0] = 0
+    capacity = int(demands.sum() / num_vehicles * 1.25) + 1
+    return VRPRequest(
+        locations=[
+            {"id": f"P{i}", "lat": float(lats[i]), "lng": float(lngs[i]), "demand": float(demands[i])}
+            for i in range(n)
+        ],
+        vehicles=[
+            {"id": f"T{v}", "capacity": capacity, "start_location_id": "P0"}
+            for v in range(num_vehicles)
+        ],
+    )
+
+
+def run_monolithic(request):
+    return solve(request)
+
+
+def run_decomposed(request, executor, cluster_size):
+    subproblems = partition(request, cluster_size=cluster_size)
+    return stitch(request, list(executor.map(solve, subproblems)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 1000, 2000])
+    parser.add_argument("--vehicles", type=int, default=40)
+    parser.add_argument("--cluster-size", type=int, default=250)
+    parser.add_argument("--mode", choices=["geo", "capacity"], default="capacity")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    print(f"{'N':>6} | {'method':>12} | {'wall (s)':>8} | {'distance (km)':>13} | status")
+    print("-" * 60)
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        for n in args.sizes:
+            request = make_request(n, args.vehicles)
+            runs = [
+                ("monolithic", lambda: run_monolithic(request)),
+                ("decomposed", lambda: run_decomposed(
+                    request.model_copy(update={"decomposition": args.mode}), executor, args.cluster_size
+                )),
+            ]
+            for name, run in runs:
+                start = time.perf_counter()
+                result = run()
+                wall = time.perf_counter() - start
+                distance = result.get("metrics", {}).get("total_distance_km")
+                print(f"{n:>6} | {name:>12} | {wall:>8.1f} | "
+                      f"{distance if distance is not None else '-':>13} | {result['status']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark : construction de la matrice de distances (boucle Python vs NumPy).
+
+Usage (depuis services/logistics/vrp-engine) :
+    python benchmarks/bench_matrix.py
+    python benchmarks/bench_matrix.py --sizes 100 1000 5000 --legacy-max 1000
+"""
+import argparse
+import math
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from matrix import build_distance_matrix  # noqa: E402
+
+
+def legacy_matrix(locations, constraints):
+    """Copie conforme de la double boucle historique de optimize()."""
+    def haversine(p1, p2):
+        R = 6371
+        dlat = math.radians(p2.lat - p1.lat)
+        dlng = math.radians(p2.lng - p1.lng)
+        lat1 = math.radians(p1.lat)
+        lat2 = math.radians(p2.lat)
+        a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng / 2)**2
+        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+        return R * c
+
+    n = len(locations)
+    matrix = []
+    for i in range(n):
+        row = []
+        for j in range(n):
+            dist = haversine(locations[i], locations[j])
+            if constraints.get('off_road'):
+                dist *= 1.2
+            row.append(int(dist * 1000))
+        matrix.append(row)
+    return matrix
+
+
+def random_locations(n, seed=42):
+    # Region around Bouaké, ~200 km across
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(6.8, 8.6, n)
+    lngs = rng.uniform(-6.0, -4.2, n)
+    return [SimpleNamespace(lat=float(a), lng=float(b)) for a, b in zip(lats, lngs)]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--legacy-max", type=int, default=5000,
+                        help="skip the legacy loop above this size")
+    parser.add_argument("--off-road", action="store_true")
+    args = parser.parse_args()
+    constraints = {"off_road": args.off_road}
+
+    print(f"{'N':>6} | {'legacy (s)':>11} | {'numpy (s)':>10} | {'speedup':>8} | max |diff| (m)")
+    print("-" * 62)
+    for n in args.sizes:
+        locations = random_locations(n)
+        fast, t_fast = timed(build_distance_matrix, locations, constraints)
+
+        if n <= args.legacy_max:
+            slow, t_slow = timed(legacy_matrix, locations, constraints)
+            diff = int(np.abs(fast.astype(np.int64) - np.asarray(slow, dtype=np.int64)).max())
+            print(f"{n:>6} | {t_slow:>11.3f} | {t_fast:>10.4f} | {t_slow / t_fast:>7.0f}x | {diff}")
+        else:
+            print(f"{n:>6} | {'skipped':>11} | {t_fast:>10.4f} | {'-':>8} | -")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark : voisinage par k plus proches voisins (constraints.candidate_successors).
+
+Pour chaque k, même instance et même budget de temps : arcs pénalisés,
+solutions trouvées par seconde, objectif et écart à la recherche dense
+("*" : aucune solution sur le voisinage, résolu en dense).
+
+Usage (depuis services/logistics/vrp-engine) :
+    python benchmarks/bench_pruning.py --stops 1000 --k 5 10 20 40 --time-limit-ms 10000
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from instances import generate_instance  # noqa: E402
+from solver import cached_matrices, solve  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--stops", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--k", type=int, nargs="+", default=[5, 10, 20, 40])
+    parser.add_argument("--time-limit-ms", type=int, default=10000)
+    parser.add_argument("--time-windows", action="store_true")
+    parser.add_argument("--fleet-factor", type=float, default=1.0)
+    args = parser.parse_args()
+
+    base = generate_instance(args.stops, seed=args.seed, time_windows=args.time_windows,
+                             fleet_factor=args.fleet_factor)
+    cached_matrices(base)  # same matrices for every run
+
+    print(f"{args.stops} stops, {len(base.vehicles)} vehicles, {args.time_limit_ms} ms per run")
+    print(f"{'k':>5} | {'penalized':>11} | {'solutions/s':>11} | {'objective km':>12} | {'gap':>7}")
+    print("-" * 60)
+    dense = None
+    for k in [None] + sorted(args.k):
+        constraints = {**base.constraints, "convergence_window_ms": args.time_limit_ms}
+        if k is not None:
+            constraints["candidate_successors"] = k
+        result = solve(base.model_copy(update={"constraints": constraints}),
+                       time_limit_ms=args.time_limit_ms)
+        label = "dense" if k is None else str(k)
+        if result["status"] == "optimized" and result["metrics"]["candidate_fallback"]:
+            label += "*"
+        if result["status"] != "optimized":
+            print(f"{label:>5} | {'-':>11} | {'-':>11} | {'no solution':>12} | {'-':>7}")
+            continue
+        metrics = result["metrics"]
+        objective = metrics["total_distance_km"]
+        rate = metrics["solutions_found"] / (metrics["solve_time_ms"] / 1000)
+        dense = dense if k is not None else objective
+        gap = f"{(objective / dense - 1) * 100:+.1f}%" if dense else "-"
+        print(f"{label:>5} | {metrics['penalized_arcs']:>11} | {rate:>11.1f} | {objective:>12.1f} | {gap:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Instances VRP synthétiques reproductibles (graine fixe) proches de nos
+tournées de collecte : villages regroupés autour de quelques pôles, un ou
+plusieurs dépôts (magasins de coopérative), demandes en caisses suivant une
+loi log-normale et, en option, des fenêtres horaires de marché.
+"""
+import math
+
+import numpy as np
+
+from matrix import EARTH_RADIUS_KM
+from models import VRPRequest
+from solver import DEFAULT_SPEED_KMH
+
+# Central Côte d'Ivoire collection basin (~200 km across)
+REGION = {"lat": (6.8, 8.6), "lng": (-6.0, -4.2)}
+VILLAGE_RADIUS_KM = 3.0
+STOPS_PER_VILLAGE = 12
+CRATES_MEDIAN = 4
+TRUCK_CAPACITY = 120  # crates
+DEPOT_HOURS = (300, 1200)  # minutes since 00:00
+MARKET_OPENINGS = (360, 480, 600, 840)
+MARKET_WINDOW_MIN = 180
+
+
+def _haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def generate_instance(num_stops, seed=0, num_depots=1, time_windows=False,
+                      truck_capacity=TRUCK_CAPACITY, fleet_factor=1.0):
+    """
+    Génère une VRPRequest de `num_stops` points de collecte (+ dépôts).
+
+    - Villages : centres uniformes dans la région, taille ~ Pareto (quelques
+      gros bourgs, beaucoup de hameaux), arrêts gaussiens autour du centre.
+    - Demande : log-normale (médiane CRATES_MEDIAN caisses), au moins 1.
+    - Fenêtres : créneau de marché tiré parmi ceux atteignables depuis le
+      dépôt le plus proche dans ses heures d'ouverture (instance faisable).
+    - Flotte : dimensionnée pour ~80 % de remplissage moyen (doublée avec
+      fenêtres horaires), multipliée par `fleet_factor`.
+    """
+    rng = np.random.default_rng(seed)
+    num_villages = max(1, num_stops // STOPS_PER_VILLAGE)
+    centers_lat = rng.uniform(*REGION["lat"], num_villages)
+    centers_lng = rng.uniform(*REGION["lng"], num_villages)
+    sizes = rng.pareto(1.5, num_villages) + 1
+    village = rng.choice(num_villages, size=num_stops, p=sizes / sizes.sum())
+
+    spread_deg = VILLAGE_RADIUS_KM / 111.0
+    lats = centers_lat[village] + rng.normal(0, spread_deg, num_stops)
+    lngs = centers_lng[village] + rng.normal(0, spread_deg, num_stops)
+    demands = np.maximum(1, np.round(rng.lognormal(math.log(CRATES_MEDIAN), 0.6, num_stops)))
+
+    # Depots sit in the largest villages
+    depot_villages = np.argsort(-sizes)[:num_depots]
+    locations = [
+        {"id": f"DEPOT-{d}", "lat": float(centers_lat[v]), "lng": float(centers_lng[v]),
+         "time_window": DEPOT_HOURS if time_windows else None}
+        for d, v in enumerate(depot_villages)
+    ]
+    if time_windows:
+        depot_km = _haversine_km(centers_lat[depot_villages][:, None], centers_lng[depot_villages][:, None],
+                                 lats[None, :], lngs[None, :]).min(axis=0)
+        drive_min = depot_km / DEFAULT_SPEED_KMH * 60
+    for i in range(num_stops):
+        stop = {"id": f"STOP-{i}", "lat": float(lats[i]), "lng": float(lngs[i]),
+                "demand": float(demands[i]), "service_time": 5}
+        if time_windows:
+            reachable = [
+                o for o in MARKET_OPENINGS
+                if DEPOT_HOURS[0] + drive_min[i] <= o + MARKET_WINDOW_MIN
+                and o + drive_min[i] <= DEPOT_HOURS[1]
+            ]
+            if reachable:
+                opening = int(rng.choice(reachable))
+                stop["time_window"] = (opening, opening + MARKET_WINDOW_MIN)
+        locations.append(stop)
+
+    num_vehicles = max(1, math.ceil(demands.sum() / (truck_capacity * 0.8)))
+    if time_windows:
+        num_vehicles = math.ceil(num_vehicles * 2)
+    num_vehicles = math.ceil(num_vehicles * fleet_factor)
+    vehicles = [
+        {"id": f"TRUCK-{v}", "capacity": truck_capacity,
+         "start_location_id": locations[v % num_depots]["id"]}
+        for v in range(num_vehicles)
+    ]
+    return VRPRequest(locations=locations, vehicles=vehicles)
@@ -0,0 +1,160 @@
+"""
+Suite de benchmarks du moteur VRP sur instances synthétiques reproductibles.
+
+Chaque cas est exécuté dans un processus neuf (mesure de mémoire propre)
+via la logique de /optimize (solver.solve), et l'on enregistre : temps de
+construction des matrices, temps de résolution, objectif et pic mémoire.
+Les résultats sont écrits en JSON pour comparer les commits entre eux.
+
+Usage (depuis services/logistics/vrp-engine) :
+    python benchmarks/run_suite.py                        # preset quick
+    python benchmarks/run_suite.py --preset full -o results/full.json
+    python benchmarks/run_suite.py --compare old.json new.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PRESETS = {
+    "quick": [10, 100, 1000],
+    "full": [10, 50, 100, 500, 1000, 2000, 5000, 10000],
+}
+METRICS = ("matrix_build_ms", "solve_ms", "objective_km", "peak_rss_mb")
+
+
+def run_case(num_stops, seed, time_windows, max_latency_ms, num_depots=1):
+    """Exécuté dans un processus dédié."""
+    # Keep the largest matrices cached so solve() does not rebuild them
+    os.environ.setdefault("VRP_MATRIX_CACHE_MB", "8192")
+    os.environ.setdefault("VRP_SOLVER_WORKERS", "1")  # the whole cache for this process
+    from instances import generate_instance
+    from solver import cached_matrices, solve
+
+    request = generate_instance(num_stops, seed=seed, time_windows=time_windows,
+                                num_depots=num_depots)
+    if max_latency_ms is not None:
+        request = request.model_copy(update={"max_latency_ms": max_latency_ms})
+
+    start = time.perf_counter()
+    cached_matrices(request)  # the solve below reuses them from the cache
+    matrix_build_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    result = solve(request)
+    total_solve_ms = (time.perf_counter() - start) * 1000
+
+    metrics = result.get("metrics", {})
+    return {
+        "stops": num_stops,
+        "seed": seed,
+        "time_windows": time_windows,
+        "depots": num_depots,
+        "vehicles": len(request.vehicles),
+        "status": result["status"],
+        "matrix_build_ms": round(matrix_build_ms, 1),
+        "solve_ms": round(total_solve_ms, 1),
+        "search_ms": metrics.get("solve_time_ms"),
+        "solutions_found": metrics.get("solutions_found"),
+        "objective_km": metrics.get("total_distance_km"),
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes, seeds, time_windows, max_latency_ms, num_depots=1):
+    from ortools import __version__ as ortools_version
+
+    cases = []
+    context = multiprocessing.get_context("spawn")
+    for num_stops in sizes:
+        for seed in seeds:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                case = executor.submit(
+                    run_case, num_stops, seed, time_windows, max_latency_ms, num_depots
+                ).result()
+            print(f"{case['stops']:>6} stops seed={seed} | matrix {case['matrix_build_ms']:>9.1f} ms"
+                  f" | solve {case['solve_ms']:>9.1f} ms | {case['objective_km']} km"
+                  f" | {case['peak_rss_mb']} MB | {case['status']}")
+            cases.append(case)
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "ortools": ortools_version,
+        "cpu_count": os.cpu_count(),
+        "cases": cases,
+    }
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    key = lambda c: (c["stops"], c["seed"], c["time_windows"], c.get("depots", 1))
+    old_cases = {key(c): c for c in old["cases"]}
+
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    print(f"{'stops':>6} {'seed':>4} | " + " | ".join(f"{m:>22}" for m in METRICS))
+    for case in new["cases"]:
+        before = old_cases.get(key(case))
+        if before is None:
+            continue
+        cells = []
+        for metric in METRICS:
+            a, b = before.get(metric), case.get(metric)
+            if a is None or b is None:
+                cells.append(f"{'-':>22}")
+            else:
+                delta = (b - a) / a * 100 if a else 0.0
+                cells.append(f"{a:>9} -> {b:<9}{delta:+.0f}%".rjust(22))
+        print(f"{case['stops']:>6} {case['seed']:>4} | " + " | ".join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--preset", choices=PRESETS, default="quick")
+    parser.add_argument("--sizes", type=int, nargs="+", help="overrides --preset")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--time-windows", action="store_true")
+    parser.add_argument("--depots", type=int, default=1)
+    parser.add_argument("--max-latency-ms", type=int, default=None)
+    parser.add_argument("-o", "--output", help="JSON file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run_suite(args.sizes or PRESETS[args.preset], args.seeds,
+                       args.time_windows, args.max_latency_ms, args.depots)
+    output = args.output or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "results", f"{report['commit'] or 'local'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
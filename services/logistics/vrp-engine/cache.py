@@ -0,0 +1,188 @@
+"""
+Cache adressé par contenu pour les matrices de distances et les solutions.
+
+- Matrices : clé = empreinte des coordonnées + contraintes qui modifient les
+  matrices (off_road, arc_factors, fournisseur et région). Réutilisées dès que l'ensemble de lieux
+  est identique, même si les demandes changent.
+- Solutions : clé = empreinte canonique de la requête complète.
+
+Par défaut, LRU en mémoire du processus, borné en octets. Si
+VRP_CACHE_REDIS_URL est défini, un backend Redis (ou compatible) est
+utilisé à la place ; l'éviction LRU est alors celle du serveur
+(maxmemory-policy allkeys-lru).
+"""
+import hashlib
+import io
+import json
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# In-memory backend: total over the solver workers, each process keeping
+# its own LRU (no reuse across workers; use Redis for a shared cache)
+MATRIX_CACHE_MB = int(os.getenv("VRP_MATRIX_CACHE_MB", 256))
+SOLUTION_CACHE_MB = int(os.getenv("VRP_SOLUTION_CACHE_MB", 64))
+CACHE_REDIS_URL = os.getenv("VRP_CACHE_REDIS_URL")
+CACHE_TTL_S = int(os.getenv("VRP_CACHE_TTL_S", 24 * 3600))
+
+# Constraints that change the distance/travel-time matrices themselves
+MATRIX_CONSTRAINTS = ("off_road", "arc_factors", "matrix_provider", "region")
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else
+                 json.dumps(part, sort_keys=True, separators=(",", ":"), default=str).encode())
+    return h.hexdigest()
+
+
+def matrix_key(locations, constraints):
+    coords = np.array([(loc.lat, loc.lng) for loc in locations], dtype=np.float64)
+    relevant = {name: constraints.get(name) for name in MATRIX_CONSTRAINTS}
+    return "matrix:" + _digest(coords.tobytes(), relevant)
+
+
+def solution_key(request):
+    return "solution:" + _digest(request.model_dump(mode="json"))
+
+
+def _matrix_dumps(matrices):
+    buffer = io.BytesIO()
+    np.savez(buffer, **matrices)
+    return buffer.getvalue()
+
+
+def _matrix_loads(data):
+    with np.load(io.BytesIO(data), allow_pickle=False) as archive:
+        return {name: archive[name] for name in archive.files}
+
+
+def _json_dumps(value):
+    return json.dumps(value, separators=(",", ":")).encode()
+
+
+class LRUCache:
+    """LRU en mémoire borné par la taille (octets) des valeurs stockées."""
+    backend = "memory"
+
+    def __init__(self, max_bytes, sizeof):
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof
+        self._data = OrderedDict()
+        self._sizes = {}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value):
+        size = self._sizeof(value)
+        if size > self.max_bytes:
+            return
+        if key in self._data:
+            del self._data[key]
+            self.bytes -= self._sizes.pop(key)
+        self._data[key] = value
+        self._sizes[key] = size
+        self.bytes += size
+        while self.bytes > self.max_bytes:
+            old_key, _ = self._data.popitem(last=False)
+            self.bytes -= self._sizes.pop(old_key)
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "backend": self.backend,
+            "entries": len(self._data),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class RedisCache:
+    """Même interface que LRUCache, valeurs sérialisées dans Redis avec TTL."""
+    backend = "redis"
+
+    def __init__(self, url, dumps, loads, ttl_s=CACHE_TTL_S):
+        if redis is None:
+            raise RuntimeError("VRP_CACHE_REDIS_URL is set but the 'redis' package is not installed")
+        self._client = redis.Redis.from_url(url)
+        self._dumps = dumps
+        self._loads = loads
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        try:
+            data = self._client.get(key)
+        except redis.RedisError:
+            data = None  # cache outage degrades to a miss
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._loads(data)
+
+    def set(self, key, value):
+        try:
+            self._client.set(key, self._dumps(value), ex=self.ttl_s)
+        except redis.RedisError:
+            pass
+
+    def stats(self):
+        return {"backend": self.backend, "hits": self.hits, "misses": self.misses}
+
+
+def matrix_cache(processes=1):
+    """Cache de matrices d'un des `processes` workers (part égale de MATRIX_CACHE_MB en mémoire)."""
+    if CACHE_REDIS_URL:
+        return RedisCache(CACHE_REDIS_URL, _matrix_dumps, _matrix_loads)
+    return LRUCache(MATRIX_CACHE_MB * 1024 * 1024 // max(1, processes),
+                    sizeof=lambda matrices: sum(m.nbytes for m in matrices.values()))
+
+
+def solution_cache():
+    if CACHE_REDIS_URL:
+        return RedisCache(CACHE_REDIS_URL, _json_dumps, json.loads)
+    return LRUCache(SOLUTION_CACHE_MB * 1024 * 1024, sizeof=lambda r: len(_json_dumps(r)))
+
+
+class MatrixCacheStats:
+    """
+    Les matrices sont mises en cache dans les workers du SolverPool ; chaque
+    résultat indique s'il a réutilisé une matrice (metrics.matrix_cache_hits)
+    et le processus API agrège ces compteurs pour /health.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, metrics):
+        solves = metrics.get("subproblems", 1)
+        hits = metrics.get("matrix_cache_hits", 0)
+        self.hits += hits
+        self.misses += solves - hits
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
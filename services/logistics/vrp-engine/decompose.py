@@ -0,0 +1,181 @@
+"""
+Décomposition « cluster-first, route-second » des grandes instances VRP.
+
+Les véhicules sont répartis en groupes de capacité comparable, puis les
+arrêts sont balayés par angle autour du dépôt (sweep) et découpés en
+secteurs contigus, proportionnels au nombre de véhicules du groupe (`geo`)
+ou à sa capacité (`capacity`). Chaque couple secteur/groupe devient un
+sous-problème indépendant, résolu en parallèle dans le SolverPool ; les
+résultats sont recousus au format de réponse de /optimize.
+
+Multi-dépôts : le balayage se fait autour du barycentre des dépôts et les
+groupes sont formés de véhicules dont les dépôts sont angulairement
+voisins, pour que chaque secteur soit servi depuis les dépôts de son côté.
+"""
+import math
+
+import numpy as np
+
+from solver import solve, throw_error, vehicle_depots
+
+DECOMPOSITION_MODES = ("geo", "capacity")
+DEFAULT_CLUSTER_SIZE = 250
+
+
+def _angles(locations, nodes, center):
+    lats = np.array([locations[i].lat for i in nodes])
+    lngs = np.array([locations[i].lng for i in nodes])
+    return np.arctan2(lats - center[0], (lngs - center[1]) * math.cos(math.radians(center[0])))
+
+
+def _sweep_order(locations, stops, center):
+    """Arrêts triés par angle autour de `center` (lat, lng), en commençant
+    après le plus grand secteur vide pour ne pas couper un groupe de
+    villages en deux. Retourne (arrêts ordonnés, angle de départ)."""
+    angles = _angles(locations, stops, center)
+    order = np.argsort(angles)
+    sorted_angles = angles[order]
+    gaps = np.diff(np.concatenate([sorted_angles, sorted_angles[:1] + 2 * math.pi]))
+    start = (int(np.argmax(gaps)) + 1) % len(order)
+    return stops[np.roll(order, -start)], sorted_angles[start]
+
+
+def _vehicle_groups(vehicles, num_groups, angles=None):
+    """Distribue les véhicules (les plus gros d'abord) en serpentin pour
+    obtenir des groupes de capacité comparable. Avec `angles` (angle du
+    dépôt de chaque véhicule depuis le début du balayage), les groupes sont
+    des tranches angulaires contiguës de capacité comparable."""
+    if angles is not None:
+        by_angle = np.argsort(angles, kind="stable")
+        capacities = [vehicles[i].capacity for i in by_angle]
+        chunks = _split(capacities, np.full(num_groups, 1 / num_groups))
+        return [[int(by_angle[i]) for i in chunk] for chunk in chunks]
+    groups = [[] for _ in range(num_groups)]
+    by_capacity = sorted(range(len(vehicles)), key=lambda i: -vehicles[i].capacity)
+    for rank, vehicle_index in enumerate(by_capacity):
+        lap, slot = divmod(rank, num_groups)
+        groups[slot if lap % 2 == 0 else num_groups - 1 - slot].append(vehicle_index)
+    return groups
+
+
+def _split(weights, shares):
+    """Coupe une séquence pondérée en tranches contiguës dont les poids
+    suivent les proportions `shares` (au moins un élément par tranche)."""
+    cumulative = np.cumsum(weights)
+    targets = cumulative[-1] * np.cumsum(shares)[:-1]
+    num_slices = len(shares)
+    bounds = [0]
+    for k, target in enumerate(targets, start=1):
+        cut = int(np.searchsorted(cumulative, target)) + 1
+        cut = min(max(cut, bounds[-1] + 1), len(weights) - (num_slices - k))
+        bounds.append(cut)
+    bounds.append(len(weights))
+    return [np.arange(start, stop) for start, stop in zip(bounds, bounds[1:])]
+
+
+def partition(request, cluster_size=DEFAULT_CLUSTER_SIZE):
+    """
+    Découpe la requête en sous-requêtes VRPRequest (dépôts du groupe +
+    secteur + groupe de véhicules), dans l'ordre du balayage.
+    """
+    mode = request.decomposition
+    if mode not in DECOMPOSITION_MODES:
+        throw_error(f"Unknown decomposition mode {mode!r}, expected one of {DECOMPOSITION_MODES}")
+    if not request.locations or not request.vehicles:
+        throw_error("Locations or vehicles missing")
+
+    node_of = {loc.id: node for node, loc in enumerate(request.locations)}
+    starts, ends = vehicle_depots(request.vehicles, node_of)
+    depots = set(starts) | set(ends)
+    stops = np.array([node for node in range(len(request.locations)) if node not in depots])
+    if len(stops) == 0:
+        throw_error("Locations or vehicles missing")
+
+    start_depots = sorted(set(starts))
+    center = (np.mean([request.locations[d].lat for d in start_depots]),
+              np.mean([request.locations[d].lng for d in start_depots]))
+    order, sweep_start = _sweep_order(request.locations, stops, center)
+
+    num_clusters = min(math.ceil(len(stops) / cluster_size), len(request.vehicles))
+    vehicle_angles = None
+    if len(start_depots) > 1:
+        vehicle_angles = (_angles(request.locations, starts, center) - sweep_start) % (2 * math.pi)
+    vehicle_groups = _vehicle_groups(request.vehicles, num_clusters, vehicle_angles)
+    weights = np.ones(len(order))
+    shares = np.array([len(group) for group in vehicle_groups], dtype=np.float64)
+    if mode == "capacity":
+        # Each sector gets demand in proportion to its group's capacity
+        demands = np.array([max(request.locations[i].demand, 0) for i in order], dtype=np.float64)
+        capacities = np.array([sum(request.vehicles[v].capacity for v in group)
+                               for group in vehicle_groups], dtype=np.float64)
+        if demands.sum() > 0 and capacities.sum() > 0:
+            weights, shares = demands, capacities
+    slices = [order[s] for s in _split(weights, shares / shares.sum())]
+
+    arc_factors = request.constraints.get('arc_factors')
+    subrequests = []
+    for nodes, vehicle_indices in zip(slices, vehicle_groups):
+        group_depots = sorted({starts[v] for v in vehicle_indices} | {ends[v] for v in vehicle_indices})
+        nodes = np.concatenate([group_depots, nodes]).astype(np.int64)
+        constraints = dict(request.constraints)
+        if arc_factors is not None:
+            constraints['arc_factors'] = np.asarray(arc_factors)[np.ix_(nodes, nodes)].tolist()
+        subrequests.append(request.model_copy(update={
+            "locations": [request.locations[i] for i in nodes],
+            "vehicles": [request.vehicles[i] for i in vehicle_indices],
+            "constraints": constraints,
+            "decomposition": None,
+        }))
+    return subrequests
+
+
+def solve_subproblem(progress, item):
+    """
+    Résout le sous-problème `item` = (index, sous-requête) dans un worker ;
+    sa progression éventuelle est publiée avec `subproblem: index`.
+    """
+    index, subrequest = item
+    return solve(subrequest, progress=progress.tagged(index) if progress is not None else None)
+
+
+def stitch(request, results):
+    """Recompose une réponse /optimize unique à partir des sous-résolutions."""
+    for cluster, result in enumerate(results):
+        if result.get("status") != "optimized":
+            return {
+                "status": "error",
+                "message": f"Subproblem {cluster}: {result.get('message', 'No solution found')}"
+            }
+
+    routes_by_vehicle = {
+        route["vehicle_id"]: route for result in results for route in result["routes"]
+    }
+    optimized_routes = [routes_by_vehicle[v.id] for v in request.vehicles]
+    total_distance = round(sum(route["distance_km"] for route in optimized_routes) * 1000)
+    metrics = [r["metrics"] for r in results]
+
+    # Same keys as solver.solve, plus `subproblems`
+    return {
+        "status": "optimized",
+        "quality_score": 95.0,
+        "metrics": {
+            "total_distance_km": total_distance / 1000,
+            "fuel_saved_est": f"{round(total_distance/15000, 1)}L",
+            "co2_reduction": f"{round(total_distance/25000, 1)}kg",
+            "pruned_arcs": sum(m["pruned_arcs"] for m in metrics),
+            # Every subrequest carries the request's constraints: same k everywhere
+            "candidate_successors": metrics[0]["candidate_successors"],
+            "penalized_arcs": sum(m["penalized_arcs"] for m in metrics),
+            "candidate_fallback": any(m["candidate_fallback"] for m in metrics),
+            "warm_start": any(m["warm_start"] for m in metrics),
+            "matrix_cache_hits": sum(m["matrix_cache_hits"] for m in metrics),
+            # Subproblems run in parallel: the slowest one bounds the solve
+            "time_limit_ms": max(m["time_limit_ms"] for m in metrics),
+            "solve_time_ms": max(m["solve_time_ms"] for m in metrics),
+            "solutions_found": sum(m["solutions_found"] for m in metrics),
+            "stopped_early": any(m["stopped_early"] for m in metrics),
+            "stopped_by_client": any(m["stopped_by_client"] for m in metrics),
+            "subproblems": len(results)
+        },
+        "routes": optimized_routes
+    }
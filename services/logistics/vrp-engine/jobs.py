@@ -0,0 +1,361 @@
+"""
+Pool de workers (processus) pour les résolutions OR-Tools.
+
+Les solves sont CPU-bound et tiennent le GIL : on les exécute dans un
+ProcessPoolExecutor pour que la boucle d'événements FastAPI reste libre
+(/health, soumissions concurrentes...). La file est bornée : au-delà de
+`workers + max_queue` solves en cours, les nouvelles demandes sont refusées.
+
+Progression en direct : un job peut recevoir un ProgressChannel (file et
+événement d'un multiprocessing.Manager, picklables) dans lequel le solve
+publie ses améliorations depuis le worker ; le processus API les relaie
+aux clients (SSE) et y signale les demandes d'arrêt anticipé. Les appels
+au Manager (IPC) passent par un petit pool de threads dédié, sans jamais
+bloquer en attente d'un événement : l'executor par défaut de la boucle
+reste libre.
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from queue import Empty
+from typing import Any, Optional
+
+SOLVER_WORKERS = int(os.getenv("VRP_SOLVER_WORKERS", os.cpu_count() or 1))
+SOLVER_MAX_QUEUE = int(os.getenv("VRP_SOLVER_MAX_QUEUE", 32))
+MAX_STORED_JOBS = int(os.getenv("VRP_MAX_STORED_JOBS", 1000))
+
+# Samples kept for wait/solve time percentiles
+METRICS_WINDOW = 1000
+# Progress events kept per job for late SSE subscribers
+PROGRESS_EVENTS_KEPT = 200
+PROGRESS_POLL_S = 0.2
+# Threads for the non-blocking Manager calls (progress polling, stop requests)
+PROGRESS_IPC_THREADS = 2
+
+
+class QueueFullError(Exception):
+    pass
+
+
+def _timed_call(fn, payload):
+    """Exécuté dans le worker : horodate le début réel du solve."""
+    started_at = time.time()
+    result = fn(payload)
+    return started_at, time.time(), result
+
+
+def _warm_up():
+    """Pré-charge OR-Tools dans le worker pour que le premier solve n'attende pas."""
+    import solver  # noqa: F401
+
+
+class ProgressChannel:
+    """
+    Canal worker -> API d'un solve suivi en direct : le solve publie ses
+    événements (publish) et consulte la demande d'arrêt (stop_requested).
+    Les proxys Manager restent valides une fois transmis au worker.
+    """
+
+    def __init__(self, queue, stop_event, tag=None):
+        self._queue = queue
+        self._stop_event = stop_event
+        self.tag = tag
+
+    def tagged(self, tag):
+        """Même canal ; les événements portent `subproblem: tag` (décomposition)."""
+        return ProgressChannel(self._queue, self._stop_event, tag)
+
+    def publish(self, event):
+        if self.tag is not None:
+            event = {**event, "subproblem": self.tag}
+        self._queue.put(event)
+
+    def stop_requested(self):
+        return self._stop_event.is_set()
+
+    def request_stop(self):
+        self._stop_event.set()
+
+    def drain(self, timeout):
+        """Événements en attente (bloque au plus `timeout` s s'il n'y en a aucun ; 0 : jamais)."""
+        try:
+            events = [self._queue.get(timeout=timeout)]
+        except Empty:
+            return []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except Empty:
+                return events
+
+
+@dataclass
+class Job:
+    id: str
+    submitted_at: float
+    status: str = "queued"  # queued, completed, failed
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    channel: Optional[ProgressChannel] = None
+    progress: deque = field(default_factory=lambda: deque(maxlen=PROGRESS_EVENTS_KEPT))
+    seq: int = 0
+    drained: bool = False  # every progress event has been relayed
+    changed: asyncio.Condition = field(default_factory=asyncio.Condition, repr=False)
+
+    def to_dict(self):
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "submitted_at": self.submitted_at,
+        }
+        if self.finished_at is not None:
+            data["elapsed_ms"] = round((self.finished_at - self.submitted_at) * 1000, 1)
+        if self.progress:
+            data["progress"] = {k: v for k, v in self.progress[-1].items() if k != "routes"}
+        if self.status == "completed":
+            data["result"] = self.result
+        elif self.status == "failed":
+            data["error"] = self.error
+        return data
+
+
+async def _first(awaitable):
+    return (await awaitable)[0]
+
+
+def _percentile(samples, q):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class SolverPool:
+    def __init__(self, workers=SOLVER_WORKERS, max_queue=SOLVER_MAX_QUEUE,
+                 max_jobs=MAX_STORED_JOBS):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_jobs = max_jobs
+        self._executor = None
+        self._manager = None
+        self._ipc = ThreadPoolExecutor(max_workers=PROGRESS_IPC_THREADS, thread_name_prefix="vrp-progress")
+        self._recycled = 0
+        self._in_flight = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._jobs = OrderedDict()
+        self._wait_ms = deque(maxlen=METRICS_WINDOW)
+        self._solve_ms = deque(maxlen=METRICS_WINDOW)
+
+    def start(self):
+        if self._executor is None:
+            # spawn: forking a threaded uvicorn process is unsafe
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            for _ in range(self.workers):
+                self._executor.submit(_warm_up)
+        if self._manager is None:
+            self._manager = multiprocessing.get_context("spawn").Manager()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
+
+    def progress_channel(self):
+        self.start()
+        return ProgressChannel(self._manager.Queue(), self._manager.Event())
+
+    @property
+    def queue_depth(self):
+        """Solves acceptés mais pas encore pris par un worker."""
+        return max(0, self._in_flight - self.workers)
+
+    def _reserve(self, slots=1):
+        if self._in_flight + slots > self.workers + self.max_queue:
+            self._rejected += 1
+            raise QueueFullError(
+                f"Solver queue full ({self.queue_depth} waiting), retry later"
+            )
+        self._in_flight += slots
+
+    def run(self, fn, payload):
+        """`await pool.run(fn, payload)` : map() pour un seul payload."""
+        return _first(self.map(fn, [payload]))
+
+    def map(self, fn, payloads):
+        """
+        Réserve immédiatement une place par payload (QueueFullError sinon) et
+        renvoie une coroutine qui exécute `fn` sur tous les payloads en
+        parallèle. Les résultats sont rendus dans l'ordre des payloads.
+        """
+        payloads = list(payloads)
+        self._reserve(len(payloads))
+        return self._gather(fn, payloads)
+
+    async def _gather(self, fn, payloads):
+        jobs = [Job(id=uuid.uuid4().hex, submitted_at=time.time()) for _ in payloads]
+        await asyncio.gather(*(self._execute(job, fn, p) for job, p in zip(jobs, payloads)))
+        for job in jobs:
+            if job.status == "failed":
+                raise RuntimeError(job.error)
+        return [job.result for job in jobs]
+
+    def track(self, awaitable, channel=None):
+        """
+        Expose un calcul composite (ex. map() + assemblage) comme un job
+        pollable. Avec `channel`, la progression publiée par le solve est
+        relayée dans `job.progress` (voir events()).
+        """
+        job = Job(id=uuid.uuid4().hex, submitted_at=time.time(), channel=channel)
+        self._store(job)
+        loop = asyncio.get_running_loop()
+        loop.create_task(self._track(job, awaitable))
+        if channel is not None:
+            loop.create_task(self._relay(job))
+        else:
+            job.drained = True
+        return job
+
+    async def _track(self, job, awaitable):
+        try:
+            job.result = await awaitable
+        except Exception as e:
+            # Failures of the underlying solves are already counted
+            job.status, job.error, job.finished_at = "failed", str(e), time.time()
+        else:
+            job.status = "completed"
+            job.finished_at = time.time()
+        async with job.changed:
+            job.changed.notify_all()
+
+    async def _relay(self, job):
+        """
+        Transfère les événements du worker vers le job jusqu'à la fin du
+        solve : relève non bloquante toutes les PROGRESS_POLL_S secondes.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            finished = job.status != "queued"
+            try:
+                events = await loop.run_in_executor(self._ipc, job.channel.drain, 0)
+            except (OSError, EOFError):
+                events, finished = [], True  # manager gone (shutdown)
+            for event in events:
+                job.seq += 1
+                job.progress.append({"seq": job.seq, **event})
+            if finished and not events:
+                break
+            if events:
+                async with job.changed:
+                    job.changed.notify_all()
+            elif not finished:
+                await asyncio.sleep(PROGRESS_POLL_S)
+        job.drained = True
+        async with job.changed:
+            job.changed.notify_all()
+
+    async def events(self, job):
+        """
+        Événements de progression du job : ceux déjà reçus (dans la limite
+        de PROGRESS_EVENTS_KEPT) puis les suivants en direct, jusqu'à la fin
+        du solve.
+        """
+        seen = 0
+        while True:
+            for event in list(job.progress):
+                if event["seq"] > seen:
+                    seen = event["seq"]
+                    yield event
+            if job.drained and job.status != "queued":
+                return
+            async with job.changed:
+                await job.changed.wait_for(
+                    lambda: job.seq > seen or (job.drained and job.status != "queued")
+                )
+
+    async def stop(self, job):
+        """Demande l'arrêt anticipé : le solve rend la meilleure solution trouvée."""
+        if job.channel is not None and job.status == "queued":
+            await asyncio.get_running_loop().run_in_executor(self._ipc, job.channel.request_stop)
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    async def _execute(self, job, fn, payload):
+        self.start()
+        loop = asyncio.get_running_loop()
+        executor = self._executor
+        try:
+            started_at, finished_at, result = await loop.run_in_executor(
+                executor, _timed_call, fn, payload
+            )
+        except BrokenProcessPool as e:
+            self._recycle(executor)
+            self._fail(job, f"Solver worker crashed: {e}")
+        except Exception as e:
+            self._fail(job, str(e))
+        else:
+            job.finished_at, job.result = finished_at, result
+            job.status = "completed"
+            self._completed += 1
+            self._wait_ms.append((started_at - job.submitted_at) * 1000)
+            self._solve_ms.append((finished_at - started_at) * 1000)
+        finally:
+            self._in_flight -= 1
+
+    def _recycle(self, failed):
+        """
+        Remplace le pool de processus cassé (un worker est mort, ex. crash
+        natif). Tous ses jobs échouent en même temps : seul le premier le
+        remplace. Le Manager, et donc les canaux de progression des autres
+        jobs, restent en place.
+        """
+        if self._executor is not failed:
+            return
+        failed.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        self._recycled += 1
+        self.start()
+
+    def _fail(self, job, message):
+        job.status = "failed"
+        job.error = message
+        job.finished_at = time.time()
+        self._failed += 1
+
+    def _store(self, job):
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.max_jobs:
+            oldest_id = next(iter(self._jobs))
+            if self._jobs[oldest_id].status == "queued":
+                break
+            del self._jobs[oldest_id]
+
+    def metrics(self):
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "pool_recycled": self._recycled,
+            "wait_ms_avg": round(sum(self._wait_ms) / len(self._wait_ms), 1) if self._wait_ms else 0.0,
+            "wait_ms_p95": round(_percentile(self._wait_ms, 0.95), 1),
+            "solve_ms_avg": round(sum(self._solve_ms) / len(self._solve_ms), 1) if self._solve_ms else 0.0,
+        }
@@ -1,151 +1,229 @@
-from fastapi import FastAPI, HTTPException, Body
-from pydantic import BaseModel
-from typing import List, Optional
-import math
-from ortools.constraint_solver import routing_enums_pb2
-from ortools.constraint_solver import pywrapcp
+import asyncio
+import copy
+import json
+from functools import partial
+from typing import List
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+
+from cache import MatrixCacheStats, solution_cache, solution_key
+from decompose import partition, solve_subproblem, stitch
+from jobs import QueueFullError, SolverPool
+from models import VRPRequest, ReoptimizeRequest
+from plans import PlanStore, apply_changes
+from solver import REOPTIMIZE_TIME_LIMIT_MS, solve
 
 app = FastAPI(title="AgroDeep VRP Neural Engine")
 
-class Location(BaseModel):
-    id: str
-    lat: float
-    lng: float
-    demand: float = 0
-    time_window: Optional[tuple] = None # (start, end) in minutes from 00:00
+solver_pool = SolverPool()
+plans = PlanStore()
+solutions = solution_cache()
+matrix_stats = MatrixCacheStats()
 
-class Vehicle(BaseModel):
-    id: str
-    capacity: float
-    start_location_id: str
+@app.on_event("startup")
+async def startup():
+    solver_pool.start()
 
-class VRPRequest(BaseModel):
-    locations: List[Location]
-    vehicles: List[Vehicle]
-    strategy: str = "time" # time, cost, eco, balance
-    constraints: dict = {}
+@app.on_event("shutdown")
+async def shutdown():
+    solver_pool.shutdown()
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "engine": "OR-Tools CVRPTW"}
+    return {
+        "status": "healthy",
+        "engine": "OR-Tools CVRPTW",
+        "solver_pool": solver_pool.metrics(),
+        "stored_plans": len(plans),
+        "cache": {
+            "matrix": matrix_stats.stats(),
+            "solution": solutions.stats()
+        }
+    }
+
+async def _stitched(request, pending):
+    return stitch(request, await pending)
+
+async def _cached(result):
+    return result
+
+async def _solution_cache(method, *args):
+    """
+    Appel au cache de solutions : Redis (E/S bloquante) dans un thread pour
+    ne pas figer la boucle d'événements ; le LRU en mémoire, lui, n'est pas
+    thread-safe et reste sur la boucle.
+    """
+    if solutions.backend == "redis":
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+async def _planned(request, pending, parent_id=None, cache_key=None):
+    """
+    Enregistre les solutions réussies pour /reoptimize (plan_id) et, si
+    `cache_key` est fourni, dans le cache de solutions.
+    """
+    result = await pending
+    if result.get("status") == "optimized":
+        matrix_stats.record(result["metrics"])
+        result["metrics"]["cached"] = False
+        if cache_key is not None:
+            await _solution_cache(solutions.set, cache_key, copy.deepcopy(result))
+        result["plan_id"] = plans.put(request, result, parent_id)
+    return result
+
+async def schedule(request: VRPRequest, progress=None):
+    """
+    Planifie la résolution (monolithique ou décomposée) dans le SolverPool et
+    renvoie un awaitable. Les places sont réservées dès la consultation du
+    cache faite : une file pleine lève QueueFullError avant toute réponse.
+    Une requête identique à une requête déjà résolue est servie depuis le
+    cache de solutions (metrics.cached, solve_time_ms du solve d'origine).
+    `progress` (ProgressChannel) reçoit les améliorations du solve.
+    """
+    key = solution_key(request)
+    cached = await _solution_cache(solutions.get, key)
+    if cached is not None:
+        result = copy.deepcopy(cached)
+        result["metrics"]["cached"] = True
+        result["plan_id"] = plans.put(request, result)
+        return _cached(result)
+    if request.decomposition:
+        subproblems = list(enumerate(partition(request)))
+        pending = solver_pool.map(partial(solve_subproblem, progress), subproblems)
+        return _planned(request, _stitched(request, pending), cache_key=key)
+    return _planned(request, solver_pool.run(partial(solve, progress=progress), request), cache_key=key)
 
 @app.post("/optimize")
 async def optimize(request: VRPRequest):
     """
     Optimise les routes en utilisant Google OR-Tools.
     Implémente CVRPTW (Capacitated Vehicle Routing Problem with Time Windows).
+    Le solve tourne dans le SolverPool, hors de la boucle d'événements.
     """
     try:
-        num_locations = len(request.locations)
-        num_vehicles = len(request.vehicles)
-        
-        if num_locations == 0 or num_vehicles == 0:
-            throw_error("Locations or vehicles missing")
-
-        # 1. Distance & Time Matrix (Haversine for simplicity, normally OSRM)
-        def haversine(p1, p2):
-            R = 6371  # earth radius in km
-            dlat = math.radians(p2.lat - p1.lat)
-            dlng = math.radians(p2.lng - p1.lng)
-            lat1 = math.radians(p1.lat)
-            lat2 = math.radians(p2.lat)
-            a = math.sin(dlat / 2)**2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlng / 2)**2
-            c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-            return R * c
-
-        distance_matrix = []
-        for i in range(num_locations):
-            row = []
-            for j in range(num_locations):
-                dist = haversine(request.locations[i], request.locations[j])
-                # Africa Constraint: Speed adjustment for tracks/mud
-                if request.constraints.get('off_road'):
-                    dist *= 1.2 # simulate 20% more effort/time on tracks
-                row.append(int(dist * 1000)) # in meters
-            distance_matrix.append(row)
-
-        # 2. Solver Data Model
-        manager = pywrapcp.RoutingIndexManager(num_locations, num_vehicles, 0)
-        routing = pywrapcp.RoutingModel(manager)
-
-        def distance_callback(from_index, to_index):
-            from_node = manager.IndexToNode(from_index)
-            to_node = manager.IndexToNode(to_index)
-            return distance_matrix[from_node][to_node]
-
-        transit_callback_index = routing.RegisterTransitCallback(distance_callback)
-        routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
-
-        # 3. Capacity Constraints
-        def demand_callback(from_index):
-            from_node = manager.IndexToNode(from_index)
-            return int(request.locations[from_node].demand)
-
-        demand_callback_index = routing.RegisterUnaryTransitCallback(demand_callback)
-        routing.AddDimensionWithVehicleCapacity(
-            demand_callback_index,
-            0,  # null capacity slack
-            [int(v.capacity) for v in request.vehicles],
-            True,  # start cumul to zero
-            'Capacity'
-        )
+        pending = await schedule(request)
+        return await pending
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # 4. Search Parameters
-        search_parameters = pywrapcp.DefaultRoutingSearchParameters()
-        search_parameters.first_solution_strategy = (
-            routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-        )
-        search_parameters.local_search_metaheuristic = (
-            routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+async def _indexed(index, pending):
+    try:
+        result = await pending
+    except Exception as e:
+        result = {"status": "error", "message": str(e)}
+    return {"index": index, **result}
+
+async def _batch_lines(requests):
+    """
+    Résout les problèmes d'un lot en parallèle (au plus un par worker à la
+    fois pour laisser de la place aux autres clients) et produit une ligne
+    NDJSON par problème, dans l'ordre de fin de résolution.
+    """
+    pending = set()
+    next_index = 0
+    while next_index < len(requests) or pending:
+        while next_index < len(requests) and len(pending) < solver_pool.workers:
+            try:
+                awaitable = await schedule(requests[next_index])
+            except QueueFullError:
+                break  # pool busy with other traffic: wait for one of ours
+            except Exception as e:
+                awaitable = _cached({"status": "error", "message": str(e)})
+            pending.add(asyncio.ensure_future(_indexed(next_index, awaitable)))
+            next_index += 1
+        if not pending:
+            await asyncio.sleep(0.1)
+            continue
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            yield json.dumps(task.result()) + "\n"
+
+@app.post("/optimize/batch")
+async def optimize_batch(requests: List[VRPRequest]):
+    """
+    Optimise un lot de problèmes VRP indépendants (ex. plans nocturnes des
+    coopératives) répartis sur tout le SolverPool. Les résultats sont
+    streamés en NDJSON au fil de l'eau, chacun avec son `index` dans le lot.
+    """
+    return StreamingResponse(_batch_lines(requests), media_type="application/x-ndjson")
+
+@app.post("/reoptimize")
+async def reoptimize(change: ReoptimizeRequest):
+    """
+    Ré-optimise un plan existant après un changement terrain (arrêt urgent,
+    camion en panne...). Les routes du plan précédent servent de solution
+    initiale et les arrêts déjà visités restent figés.
+    """
+    plan = plans.get(change.plan_id)
+    if plan is None:
+        raise HTTPException(status_code=404, detail=f"Unknown plan {change.plan_id}")
+    try:
+        request, initial_routes, fixed_routes = apply_changes(plan, change)
+        warm_solve = partial(
+            solve,
+            initial_routes=initial_routes,
+            fixed_routes=fixed_routes,
+            time_limit_ms=REOPTIMIZE_TIME_LIMIT_MS,
         )
-        search_parameters.time_limit.seconds = 5
-
-        # 5. Solve
-        solution = routing.SolveWithParameters(search_parameters)
-
-        if not solution:
-            return {"status": "error", "message": "No solution found"}
-
-        # 6. Format Result
-        optimized_routes = []
-        total_distance = 0
-        for vehicle_id in range(num_vehicles):
-            index = routing.Start(vehicle_id)
-            route = []
-            route_dist = 0
-            while not routing.IsEnd(index):
-                node_index = manager.IndexToNode(index)
-                route.append(request.locations[node_index].id)
-                previous_index = index
-                index = solution.Value(routing.NextVar(index))
-                route_dist += routing.GetArcCostForVehicle(previous_index, index, vehicle_id)
-            
-            node_index = manager.IndexToNode(index)
-            route.append(request.locations[node_index].id)
-            
-            optimized_routes.append({
-                "vehicle_id": request.vehicles[vehicle_id].id,
-                "steps": route,
-                "distance_km": route_dist / 1000
-            })
-            total_distance += route_dist
-
-        return {
-            "status": "optimized",
-            "quality_score": 95.0,
-            "metrics": {
-                "total_distance_km": total_distance / 1000,
-                "fuel_saved_est": f"{round(total_distance/15000, 1)}L",
-                "co2_reduction": f"{round(total_distance/25000, 1)}kg"
-            },
-            "routes": optimized_routes
-        }
+        return await _planned(request, solver_pool.run(warm_solve, request), parent_id=plan.id)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/jobs", status_code=202)
+async def submit_job(request: VRPRequest):
+    """
+    Soumet un solve asynchrone ; le résultat se récupère via GET /jobs/{id},
+    la progression en direct via GET /jobs/{id}/events.
+    """
+    try:
+        channel = solver_pool.progress_channel()
+        job = solver_pool.track(await schedule(request, progress=channel), channel)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return job.to_dict()
+
+def _job_or_404(job_id):
+    job = solver_pool.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    return _job_or_404(job_id).to_dict()
+
+async def _sse_lines(job):
+    async for event in solver_pool.events(job):
+        yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+    yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
 
-def throw_error(msg):
-    raise ValueError(msg)
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Server-Sent Events : un événement `progress` par amélioration trouvée
+    (objectif, routes utilisées, temps écoulé ; plan complet dès la première
+    solution puis périodiquement), puis `completed` ou `failed` avec le job.
+    """
+    job = _job_or_404(job_id)
+    return StreamingResponse(_sse_lines(job), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+@app.post("/jobs/{job_id}/stop", status_code=202)
+async def stop_job(job_id: str):
+    """
+    Arrête la recherche au plus tôt ; le job se termine avec la meilleure
+    solution trouvée jusque-là (metrics.stopped_by_client).
+    """
+    job = _job_or_404(job_id)
+    await solver_pool.stop(job)
+    return job.to_dict()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,32 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+class Location(BaseModel):
+    id: str
+    lat: float
+    lng: float
+    demand: float = 0
+    time_window: Optional[tuple] = None # (start, end) in minutes from 00:00
+    service_time: float = 0 # minutes spent loading/unloading at the stop
+
+class Vehicle(BaseModel):
+    id: str
+    capacity: float
+    start_location_id: str
+    end_location_id: Optional[str] = None # defaults to start_location_id (round trip)
+
+class VRPRequest(BaseModel):
+    locations: List[Location]
+    vehicles: List[Vehicle]
+    strategy: str = "time" # time, cost, eco, balance
+    constraints: dict = {}
+    decomposition: Optional[str] = None # None, "geo", "capacity" (see decompose.py)
+    max_latency_ms: Optional[int] = None # upper bound on solver search time
+
+class ReoptimizeRequest(BaseModel):
+    plan_id: str
+    add_locations: List[Location] = [] # new stops, or updated ones (same id)
+    remove_location_ids: List[str] = []
+    unavailable_vehicle_ids: List[str] = [] # e.g. broken-down trucks
+    visited: Dict[str, List[str]] = {} # vehicle_id -> stops already served, in order
+    constraints: dict = {} # overrides merged into the original constraints
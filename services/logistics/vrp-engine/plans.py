@@ -0,0 +1,124 @@
+"""
+Plans optimisés conservés pour la ré-optimisation incrémentale (/reoptimize).
+
+Chaque réponse /optimize réussie est enregistrée sous un `plan_id` dans un
+magasin LRU borné (en mémoire du processus API). Une ré-optimisation part
+du plan précédent : les modifications du dispatcher (nouvel arrêt urgent,
+camion en panne, arrêts déjà servis) sont appliquées, et les routes
+précédentes deviennent la solution initiale du solveur.
+"""
+import os
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from solver import throw_error
+
+MAX_PLANS = int(os.getenv("VRP_MAX_PLANS", 500))
+
+
+@dataclass
+class Plan:
+    id: str
+    request: object  # VRPRequest
+    result: dict
+    parent_id: Optional[str] = None
+    created_at: float = 0.0
+
+
+class PlanStore:
+    def __init__(self, max_plans=MAX_PLANS):
+        self.max_plans = max_plans
+        self._plans = OrderedDict()
+
+    def put(self, request, result, parent_id=None):
+        plan = Plan(uuid.uuid4().hex, request, result, parent_id, time.time())
+        self._plans[plan.id] = plan
+        while len(self._plans) > self.max_plans:
+            self._plans.popitem(last=False)
+        return plan.id
+
+    def get(self, plan_id):
+        plan = self._plans.get(plan_id)
+        if plan is not None:
+            self._plans.move_to_end(plan_id)
+        return plan
+
+    def __len__(self):
+        return len(self._plans)
+
+
+def _depot_ids(vehicles):
+    """Identifiants des lieux de départ/arrivée des véhicules."""
+    return ({v.start_location_id for v in vehicles}
+            | {v.end_location_id or v.start_location_id for v in vehicles})
+
+
+def apply_changes(plan, change):
+    """
+    Applique une ReoptimizeRequest au plan précédent.
+
+    Retourne (nouvelle VRPRequest, routes initiales, routes figées), les
+    routes étant des dicts {vehicle_id: [location_id, ...]} sans le dépôt.
+    Les arrêts servis par un véhicule retiré du plan sont considérés comme
+    terminés ; ses arrêts restants sont à réaffecter. Un dépôt que plus
+    aucun véhicule n'utilise est retiré (il deviendrait sinon un arrêt).
+    """
+    previous = plan.request
+    vehicle_ids = {v.id for v in previous.vehicles}
+    unavailable = set(change.unavailable_vehicle_ids)
+
+    for vehicle_id in list(change.visited) + list(unavailable):
+        if vehicle_id not in vehicle_ids:
+            throw_error(f"Unknown vehicle {vehicle_id} for plan {plan.id}")
+
+    vehicles = [v for v in previous.vehicles if v.id not in unavailable]
+    if not vehicles:
+        throw_error("No vehicle left in the plan")
+    depot_ids = _depot_ids(vehicles)
+
+    removed = set(change.remove_location_ids)
+    if removed & depot_ids:
+        throw_error("The depot cannot be removed from a plan")
+    removed |= _depot_ids(previous.vehicles) - depot_ids
+    for vehicle_id in unavailable:
+        removed.update(change.visited.get(vehicle_id, []))
+
+    updates = {loc.id: loc for loc in change.add_locations}
+    locations = [updates.pop(loc.id, loc) for loc in previous.locations if loc.id not in removed]
+    locations += list(updates.values())
+
+    present = {loc.id for loc in locations}
+    fixed_routes = {}
+    visited = set()
+    for vehicle_id, location_ids in change.visited.items():
+        if vehicle_id in unavailable:
+            continue
+        for location_id in location_ids:
+            if location_id not in present or location_id in depot_ids:
+                throw_error(f"Visited stop {location_id} is not a stop of the plan")
+            if location_id in visited:
+                throw_error(f"Stop {location_id} marked as visited twice")
+            visited.add(location_id)
+        fixed_routes[vehicle_id] = list(location_ids)
+
+    initial_routes = {}
+    for route in plan.result["routes"]:
+        vehicle_id = route["vehicle_id"]
+        if vehicle_id in unavailable:
+            continue
+        remaining = [
+            location_id for location_id in route["steps"][1:-1]
+            if location_id in present and location_id not in visited
+        ]
+        initial_routes[vehicle_id] = fixed_routes.get(vehicle_id, []) + remaining
+
+    request = previous.model_copy(update={
+        "locations": locations,
+        "vehicles": vehicles,
+        "constraints": {**previous.constraints, **change.constraints},
+        "decomposition": None,
+    })
+    return request, initial_routes, fixed_routes
@@ -0,0 +1,53 @@
+"""
+Fournisseurs de matrices distance/temps pour le solveur.
+
+`constraints['matrix_provider']` choisit la source :
+- "haversine" (défaut) : distance orthodromique vectorisée (matrix.py),
+  temps déduit de `speed_kmh` ;
+- "road" : plus courts chemins sur le réseau routier local de
+  `constraints['region']` (road_network.py), temps par type de voie.
+
+Chaque fournisseur renvoie un dict de matrices int32 N x N : "distance"
+(mètres) et, s'il le connaît, "travel_s" (secondes de trajet, hors service).
+"""
+from matrix import build_distance_matrix
+
+DEFAULT_PROVIDER = "haversine"
+
+
+class HaversineProvider:
+    name = "haversine"
+
+    def matrices(self, locations, constraints):
+        return {
+            "distance": build_distance_matrix(
+                locations,
+                constraints,
+                arc_factors=constraints.get('arc_factors'),
+            )
+        }
+
+
+# Loaded road graphs are kept for the lifetime of the solver worker
+_providers = {}
+
+
+def get_provider(constraints):
+    name = constraints.get('matrix_provider', DEFAULT_PROVIDER)
+    if name == "haversine":
+        key = (name,)
+    elif name == "road":
+        region = constraints.get('region')
+        if not region:
+            raise ValueError("matrix_provider 'road' requires constraints.region")
+        key = (name, region)
+    else:
+        raise ValueError(f"Unknown matrix_provider {name!r}")
+
+    if key not in _providers:
+        if name == "road":
+            from road_network import RoadNetworkProvider
+            _providers[key] = RoadNetworkProvider(key[1])
+        else:
+            _providers[key] = HaversineProvider()
+    return _providers[key]
@@ -0,0 +1,227 @@
+"""
+Matrices distance/temps sur un réseau routier local (extrait OSM sur disque).
+
+Le réseau d'une région est lu une fois depuis `VRP_ROAD_GRAPH_DIR/<region>.osm`
+(XML OSM ; un .osm.pbf se convertit avec `osmium cat region.osm.pbf -o
+region.osm`), compilé en graphe CSR et mis en cache sous forme `.npz` à côté
+de l'extrait. Les matrices many-to-many sont calculées par Dijkstra
+multi-sources (scipy.sparse.csgraph, implémentation C) : une passe pondérée
+par la longueur pour les distances, une par le temps de parcours selon le
+type de voie et son revêtement. Aucun service réseau (OSRM...) n'est requis.
+"""
+import os
+import xml.etree.ElementTree as ET
+
+import numpy as np
+
+from matrix import EARTH_RADIUS_KM, OFF_ROAD_FACTOR
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra
+    from scipy.spatial import cKDTree
+except ImportError:
+    csr_matrix = dijkstra = cKDTree = None
+
+ROAD_GRAPH_DIR = os.getenv("VRP_ROAD_GRAPH_DIR", "data/road_graphs")
+
+# km/h by OSM highway class; rural tracks dominate collection rounds
+HIGHWAY_SPEEDS_KMH = {
+    "motorway": 90, "trunk": 80, "primary": 70, "secondary": 60,
+    "tertiary": 50, "unclassified": 40, "residential": 30, "road": 30,
+    "living_street": 15, "service": 20, "track": 15, "path": 8,
+    "motorway_link": 60, "trunk_link": 50, "primary_link": 45,
+    "secondary_link": 40, "tertiary_link": 35,
+}
+UNPAVED_SURFACES = {"unpaved", "dirt", "ground", "earth", "mud", "sand", "gravel", "grass"}
+UNPAVED_SPEED_FACTOR = 0.6
+CONNECTOR_SPEED_KMH = 10  # walking/driving from a location to the nearest road node
+UNREACHABLE_DETOUR = 1.5  # great-circle multiplier when the graph is disconnected
+# Dijkstra sources per pass: bounds the (sources x graph nodes) working array
+DIJKSTRA_CHUNK = int(os.getenv("VRP_DIJKSTRA_CHUNK", 64))
+
+
+def _haversine_m(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * 1000 * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def _iter_osm(path, tag):
+    """Éléments `tag` complets d'un fichier OSM, retirés de l'arbre après usage."""
+    context = ET.iterparse(path, events=("start", "end"))
+    _, root = next(context)
+    for event, elem in context:
+        if event == "end" and elem.tag in ("node", "way", "relation"):
+            if elem.tag == tag:
+                yield elem
+            # Top-level element done: drop it and its children from the root
+            elem.clear()
+            root.clear()
+
+
+class RoadGraph:
+    """Graphe routier orienté : nœuds (lat, lng) et arcs (longueur m, temps s)."""
+
+    def __init__(self, lats, lngs, src, dst, length_m, time_s):
+        if csr_matrix is None:
+            raise RuntimeError("The road network provider requires scipy")
+        self.lats = lats
+        self.lngs = lngs
+        self.src, self.dst = src, dst
+        self.length_m, self.time_s = length_m, time_s
+        n = len(lats)
+        self.by_length = csr_matrix((length_m, (src, dst)), shape=(n, n))
+        self.by_time = csr_matrix((time_s, (src, dst)), shape=(n, n))
+        # Equirectangular projection is plenty for nearest-node snapping
+        self._tree = cKDTree(self._project(lats, lngs))
+
+    def _project(self, lats, lngs):
+        lat0 = np.radians(np.mean(self.lats)) if len(self.lats) else 0.0
+        return np.column_stack([np.radians(lngs) * np.cos(lat0), np.radians(lats)])
+
+    @classmethod
+    def from_osm_xml(cls, path):
+        """
+        Lit les voies `highway=*` d'un extrait OSM XML en deux passes en flux :
+        les voies d'abord, puis les coordonnées des seuls nœuds qu'elles
+        utilisent. Les éléments traités sont retirés de l'arbre au fur et à
+        mesure : la mémoire suit le réseau routier, pas la taille de l'extrait.
+        """
+        ways = []
+        for elem in _iter_osm(path, "way"):
+            tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+            highway = tags.get("highway")
+            if highway in HIGHWAY_SPEEDS_KMH:
+                speed = HIGHWAY_SPEEDS_KMH[highway]
+                if tags.get("surface") in UNPAVED_SURFACES:
+                    speed *= UNPAVED_SPEED_FACTOR
+                refs = np.array([int(nd.get("ref")) for nd in elem.iter("nd")], dtype=np.int64)
+                ways.append((refs, speed, tags.get("oneway") in ("yes", "true", "1")))
+
+        used = np.unique(np.concatenate([refs for refs, _, _ in ways])) if ways else np.zeros(0, np.int64)
+        wanted = set(used.tolist())
+        ids, coords = [], []
+        for elem in _iter_osm(path, "node"):
+            node_id = int(elem.get("id"))
+            if node_id in wanted:
+                ids.append(node_id)
+                coords.append((float(elem.get("lat")), float(elem.get("lon"))))
+        del wanted
+        order = np.argsort(np.array(ids, dtype=np.int64))
+        ids = np.array(ids, dtype=np.int64)[order]
+        coords = np.array(coords, dtype=np.float64).reshape(-1, 2)[order]
+        lats, lngs = coords[:, 0].copy(), coords[:, 1].copy()
+
+        src, dst, speeds = [], [], []
+        for refs, speed, oneway in ways:
+            # Drop refs to nodes missing from the extract (clipped at its border)
+            pos = np.searchsorted(ids, refs)
+            found = pos < len(ids)
+            found[found] = ids[pos[found]] == refs[found]
+            nodes = pos[found]
+            a, b = nodes[:-1], nodes[1:]
+            src.append(a)
+            dst.append(b)
+            speeds.append(np.full(len(a), speed))
+            if not oneway:
+                src.append(b)
+                dst.append(a)
+                speeds.append(np.full(len(a), speed))
+        src = np.concatenate(src).astype(np.int32) if src else np.zeros(0, np.int32)
+        dst = np.concatenate(dst).astype(np.int32) if dst else np.zeros(0, np.int32)
+        speeds = np.concatenate(speeds) if speeds else np.zeros(0)
+        length_m = _haversine_m(lats[src], lngs[src], lats[dst], lngs[dst])
+        # csgraph treats explicit zeros as missing edges: keep duplicate nodes connected
+        length_m = np.maximum(length_m, 0.1)
+        time_s = length_m / (speeds / 3.6)
+        return cls(lats, lngs, src, dst, length_m, time_s)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["lats"], data["lngs"], data["src"], data["dst"],
+                   data["length_m"], data["time_s"])
+
+    def save(self, path):
+        np.savez_compressed(path, lats=self.lats, lngs=self.lngs, src=self.src,
+                            dst=self.dst, length_m=self.length_m, time_s=self.time_s)
+
+    def snap(self, lats, lngs):
+        """Nœud du graphe le plus proche de chaque point + distance (m) jusqu'à lui."""
+        _, nodes = self._tree.query(self._project(lats, lngs))
+        offsets = _haversine_m(lats, lngs, self.lats[nodes], self.lngs[nodes])
+        return nodes, offsets
+
+    def many_to_many(self, nodes, weight="length", chunk=DIJKSTRA_CHUNK):
+        """
+        Matrice des plus courts chemins entre `nodes` (Dijkstra multi-sources).
+
+        Les sources sont traitées par paquets de `chunk` : scipy renvoie une
+        ligne par nœud du graphe pour chaque source, seules les colonnes des
+        nœuds demandés sont gardées. Mémoire de travail : chunk x nœuds du graphe.
+        """
+        graph = self.by_length if weight == "length" else self.by_time
+        unique, inverse = np.unique(nodes, return_inverse=True)
+        dist = np.empty((len(unique), len(unique)), dtype=np.float64)
+        for start in range(0, len(unique), chunk):
+            sources = unique[start:start + chunk]
+            dist[start:start + len(sources)] = dijkstra(graph, directed=True, indices=sources)[:, unique]
+        return dist[np.ix_(inverse, inverse)]
+
+
+class RoadNetworkProvider:
+    """
+    Fournisseur de matrices pour une région : distance (m, plus court
+    chemin routier) et temps de parcours (s, plus rapide chemin).
+    """
+    name = "road"
+
+    def __init__(self, region, graph_dir=ROAD_GRAPH_DIR):
+        source = os.path.join(graph_dir, f"{region}.osm")
+        compiled = os.path.join(graph_dir, f"{region}.graph.npz")
+        if os.path.exists(compiled) and (
+            not os.path.exists(source) or os.path.getmtime(compiled) >= os.path.getmtime(source)
+        ):
+            self.graph = RoadGraph.load(compiled)
+        elif os.path.exists(source):
+            self.graph = RoadGraph.from_osm_xml(source)
+            self.graph.save(compiled)
+        else:
+            raise FileNotFoundError(f"No road graph for region {region!r} in {graph_dir}")
+        self.region = region
+
+    def matrices(self, locations, constraints):
+        arc_factors = constraints.get('arc_factors')
+        if arc_factors is not None:
+            arc_factors = np.asarray(arc_factors, dtype=np.float64)
+            if arc_factors.shape != (len(locations), len(locations)):
+                raise ValueError(
+                    f"arc_factors must be {len(locations)}x{len(locations)}, got {arc_factors.shape}"
+                )
+
+        lats = np.array([loc.lat for loc in locations], dtype=np.float64)
+        lngs = np.array([loc.lng for loc in locations], dtype=np.float64)
+        nodes, offsets = self.graph.snap(lats, lngs)
+        if constraints.get('off_road'):
+            offsets = offsets * OFF_ROAD_FACTOR
+        connectors = offsets[:, None] + offsets[None, :]
+
+        distance = self.graph.many_to_many(nodes, "length") + connectors
+        travel = self.graph.many_to_many(nodes, "time") + connectors / (CONNECTOR_SPEED_KMH / 3.6)
+
+        unreachable = ~np.isfinite(distance)
+        if unreachable.any():
+            crow = _haversine_m(lats[:, None], lngs[:, None], lats[None, :], lngs[None, :])
+            distance[unreachable] = crow[unreachable] * UNREACHABLE_DETOUR
+            travel[unreachable] = distance[unreachable] / (HIGHWAY_SPEEDS_KMH["track"] / 3.6)
+
+        if arc_factors is not None:
+            distance *= arc_factors
+            travel *= arc_factors
+        np.fill_diagonal(distance, 0)
+        np.fill_diagonal(travel, 0)
+        return {
+            "distance": distance.astype(np.int32),
+            "travel_s": np.ceil(travel).astype(np.int32),
+        }
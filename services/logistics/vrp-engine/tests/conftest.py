@@ -0,0 +1,7 @@
+import os
+import sys
+
+# The engine's modules use flat imports, as when run from vrp-engine/
+ENGINE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ENGINE_DIR not in sys.path:
+    sys.path.insert(0, ENGINE_DIR)
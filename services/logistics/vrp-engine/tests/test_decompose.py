@@ -0,0 +1,25 @@
+import numpy as np
+
+from decompose import partition, stitch
+from models import VRPRequest
+from solver import solve
+
+
+def test_stitched_metrics_have_the_solver_keys():
+    rng = np.random.default_rng(3)
+    lats, lngs = rng.uniform(6.8, 8.6, 13), rng.uniform(-6.0, -4.2, 13)
+    request = VRPRequest(
+        locations=[{"id": f"P{i}", "lat": float(lats[i]), "lng": float(lngs[i]), "demand": 1} for i in range(13)],
+        vehicles=[{"id": f"T{v}", "capacity": 10, "start_location_id": "P0"} for v in range(3)],
+        constraints={"candidate_successors": 4},
+        decomposition="geo",
+        max_latency_ms=300,
+    )
+    subrequests = partition(request, cluster_size=4)
+    stitched = stitch(request, [solve(subrequest) for subrequest in subrequests])
+    direct = solve(request.model_copy(update={"decomposition": None}))
+
+    assert stitched["status"] == direct["status"] == "optimized"
+    assert set(stitched["metrics"]) == set(direct["metrics"]) | {"subproblems"}
+    assert stitched["metrics"]["subproblems"] == len(subrequests) == 3
+    assert stitched["metrics"]["candidate_successors"] == 4
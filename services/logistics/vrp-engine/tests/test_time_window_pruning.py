@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from matrix import build_time_matrix, infeasible_arcs
+
+
+def instance(seed, n, depots):
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(0, 20_000, (n, 2))
+    distances = np.linalg.norm(points[:, None] - points[None, :], axis=-1)
+    service_s = rng.integers(0, 600, n)
+    service_s[list(depots)] = 0
+    transit = build_time_matrix(distances, 40, service_s=service_s)
+    earliest = rng.integers(0, 4 * 3600, n)
+    latest = earliest + rng.integers(300, 2 * 3600, n)
+    earliest[list(depots)] = rng.integers(0, 1800, len(depots))
+    latest[list(depots)] = 24 * 3600
+    return transit, earliest, latest
+
+
+def feasible_arcs(transit, earliest, latest, depots):
+    """Arcs entre clients empruntés par au moins une tournée réalisable (énumération exhaustive)."""
+    customers = [i for i in range(len(transit)) if i not in depots]
+    feasible = set()
+
+    def extend(node, cumul, visited):
+        for j in customers:
+            arrival = cumul + transit[node, j]
+            if j in visited or arrival > latest[j]:
+                continue
+            if node not in depots:
+                feasible.add((node, j))
+            extend(j, max(arrival, earliest[j]), visited | {j})
+
+    for depot in depots:
+        extend(depot, earliest[depot], frozenset())
+    return feasible
+
+
+@pytest.mark.parametrize("seed", range(40))
+@pytest.mark.parametrize("depots", [(0,), (0, 1)])
+def test_pruning_keeps_every_feasible_arc(seed, depots):
+    transit, earliest, latest = instance(seed, 8, depots)
+    mask = infeasible_arcs(transit, earliest, latest, depots)
+    pruned = {(i, j) for i, j in zip(*np.nonzero(mask))}
+    assert not pruned & feasible_arcs(transit, earliest, latest, depots)
+
+
+def test_pruning_removes_arcs():
+    pruned = sum(int(infeasible_arcs(*instance(seed, 8, (0,)), (0,)).sum()) for seed in range(40))
+    assert pruned > 0